@@ -2,11 +2,17 @@ from flask import Flask
 from flask_restful import Api
 
 from resources.run_scraper import Scraper
+from resources.query import PriceHistory, DividendHistory, RatioHistory, FundamentalsHistory, CrossSection
 
 app = Flask(__name__)
 api = Api(app)
 
 api.add_resource(Scraper, "/scrape")
+api.add_resource(PriceHistory, "/prices/<string:ticker>")
+api.add_resource(DividendHistory, "/dividends/<string:ticker>")
+api.add_resource(RatioHistory, "/ratios/<string:ticker>")
+api.add_resource(FundamentalsHistory, "/fundamentals/<string:ticker>")
+api.add_resource(CrossSection, "/ratios")
 
 if __name__ == "__main__":
   app.run()
\ No newline at end of file
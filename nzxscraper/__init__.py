@@ -1,9 +1,64 @@
-from os import path, remove
+from os import path
+from collections import Counter
+from queue import Queue
 import logging
 import logging.config
+import logging.handlers
+import atexit
 import json
+import multiprocessing
 
-# If applicable, delete the existing log file to generate a fresh log file during each execution
+# Arguments which can not change after the logging call, so formatting them can safely wait for the listener thread
+immutableTypes = (str, bytes, int, float, bool, type(None))
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts records on the queue without formatting them, so the message is only built on the listener thread.
+    Records never leave the process, so arguments do not need to be turned into strings first.
+
+    Records with mutable arguments (dictionaries, lists, objects) are formatted straight away instead,
+    as the caller may change them before the listener gets to the record.
+    """
+    def prepare(self, record):
+        args = record.args
+        if args and (isinstance(args, dict) or not all(isinstance(arg, immutableTypes) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+class SamplingFilter(logging.Filter):
+    """
+    Lets through the first, then every n-th, debug record from each line of code.
+    The number of records dropped from each line is logged when the logger shuts down.
+    """
+    def __init__(self, sampleEvery):
+        super().__init__()
+        self.sampleEvery = sampleEvery
+        self.counts = Counter()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.sampleEvery <= 1:
+            return True
+        callSite = (record.pathname, record.lineno)
+        self.counts[callSite] += 1
+        return (self.counts[callSite] - 1) % self.sampleEvery == 0
+
+    def summary(self):
+        """
+        Returns:
+            (List): (call site, number of dropped records) for every line which had records dropped
+        """
+        return [("{}:{}".format(path.basename(pathname), lineno), count - 1 - (count - 1) // self.sampleEvery)
+                for (pathname, lineno), count in self.counts.items() if count > 1]
+
+def stopLogging(listener, samplingFilter):
+    """
+    Logs how many debug records were sampled out, then flushes the queue and stops the listener thread
+    """
+    for callSite, dropped in samplingFilter.summary():
+        if dropped:
+            logging.getLogger(__name__).info("Sampled out {} debug records from {}".format(dropped, callSite))
+    listener.stop()
 
 def getLogger():
     """
@@ -11,23 +66,62 @@ def getLogger():
 
     Before other functions can use it, it should run once to initialise the logger first
 
+    The handlers from the configuration file are moved behind a queue, so logging calls only put a record on the queue
+    and the formatting and file writes happen on a separate listener thread
+
+    Child processes started with spawn (e.g. the pdf extraction pool on Windows) import the package again. They only get the logger,
+    so they do not start another listener. The log file is appended to, as coordinator and workers share it, see rotateLog()
+
     Returns:
         Logger: logger for the module
     """
-    if path.isfile("python_logging.log"):
-        remove("python_logging.log")
+    global logListener
+    if multiprocessing.current_process().name != 'MainProcess':
+        return logging.getLogger(__name__)
 
     with open("python_logging_configuration.json", 'r') as logging_configuration_file:
         config_dict = json.load(logging_configuration_file)
+    queue_config = config_dict.pop('queue', {})
 
     logging.config.dictConfig(config_dict)
 
+    # Move the configured handlers behind the queue
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    for handler in handlers:
+        root.removeHandler(handler)
+    logQueue = Queue(queue_config.get('maxsize', 0))
+    queueHandler = DeferredQueueHandler(logQueue)
+    # Debug records reach the sampling filter, the handlers still apply their own levels on the listener thread
+    queueHandler.setLevel(root.level)
+    samplingFilter = SamplingFilter(queue_config.get('sample_debug_every', 1))
+    queueHandler.addFilter(samplingFilter)
+    root.addHandler(queueHandler)
+    listener = logging.handlers.QueueListener(logQueue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(stopLogging, listener, samplingFilter)
+    logListener = listener
+
     # Log that the logger was configured
     logger = logging.getLogger(__name__)
     logging.getLogger("selenium").setLevel(logging.WARNING)
     logger.info('Completed configuring logger()!')
     return logger
 
+def rotateLog():
+    """
+    Starts a fresh log file for a new run, keeping the previous logs as the rotating handler's backups.
+    Only the process starting a run calls this, as workers append to the same file as the coordinator
+    """
+    for handler in logListener.handlers if logListener else ():
+        if isinstance(handler, logging.handlers.RotatingFileHandler):
+            handler.acquire()
+            try:
+                handler.doRollover()
+            finally:
+                handler.release()
+
+logListener = None
 logger = getLogger()
 
 def printProgressBar (iteration, total, prefix, suffix, decimals = 0, length = 10, fill = '█'):
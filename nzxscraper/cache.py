@@ -0,0 +1,177 @@
+"""
+Skips parsing pages which are byte for byte the same as the last time they were parsed by the same parser.
+"""
+from nzxscraper.environment import parseCacheFile
+from nzxscraper import logger
+from hashlib import blake2b
+from contextlib import contextmanager
+from functools import lru_cache
+from time import sleep, time
+import inspect
+import copy
+import json
+import re
+import os
+
+# Seconds after which a lock left behind by a crashed process is ignored
+staleLockSeconds = 60
+
+# Scripts carry session tokens and timestamps which change on every visit without changing the data
+volatileContent = re.compile(rb'<script\b.*?</script>', re.DOTALL | re.IGNORECASE)
+
+def hash_content(content):
+    """
+    Creates a short hash of a fetched page or csv
+
+    Args:
+        content (String or Bytes): page source or file content
+
+    Returns:
+        (String): 32 character hex digest of the content
+    """
+    if isinstance(content, str):
+        content = content.encode('utf8')
+    return blake2b(volatileContent.sub(b'', content), digest_size=16).hexdigest()
+
+@lru_cache(maxsize=None)
+def parser_version(parser):
+    """
+    Creates a version of a parsing function from its source code, so results cached by an older version of the parser are parsed again
+
+    Args:
+        parser (Function): the function which parses the page
+
+    Returns:
+        (String): 32 character hex digest of the source of the function
+    """
+    return hash_content(inspect.getsource(parser))
+
+class ParseCache:
+    """
+    Keeps the parsed result of every company page with the hash of the content it was parsed from, and the version of the parser.
+    The historical csvs are not cached, as their links cover a window which moves every day.
+
+    Several workers may share the cache file, so save() only writes the entries this process changed,
+    merged into whatever is on disk at the time. The file is JSON, so loading it can not run code.
+
+    Attributes:
+        entries (Dict): {ticker: {section: {'Hash': content hash, 'Parser': parser version, 'Result': parsed result}}}
+        hits (Dict): section to the number of parses skipped this run
+        misses (Dict): section to the number of parses run this run
+    """
+    def __init__(self, cacheFile=parseCacheFile):
+        self.cacheFile = cacheFile
+        self.entries = self.load()
+        self.hits = {}
+        self.misses = {}
+        # (ticker, section) parsed by this process, and tickers removed by retain(), since the last save
+        self.changed = set()
+        self.removed = set()
+
+    def load(self):
+        """
+        Reads the cache file
+
+        Returns:
+            (Dict): the entries on disk, empty if there are none
+        """
+        if not os.path.isfile(self.cacheFile):
+            return {}
+        try:
+            with open(self.cacheFile, 'r') as cache:
+                return json.load(cache)
+        except ValueError:
+            logger.warning("Parse cache is unreadable, every page will be parsed")
+            return {}
+
+    @contextmanager
+    def lock(self):
+        """
+        Holds a lock file next to the cache, so only one process merges into it at a time
+        """
+        lockFile = self.cacheFile + '.lock'
+        while True:
+            try:
+                os.close(os.open(lockFile, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                try:
+                    if time() - os.path.getmtime(lockFile) > staleLockSeconds:
+                        logger.warning("Removing stale parse cache lock")
+                        os.remove(lockFile)
+                        continue
+                except OSError:
+                    continue
+                sleep(0.1)
+        try:
+            yield
+        finally:
+            os.remove(lockFile)
+
+    def save(self):
+        """
+        Merges the entries changed by this process into the cache file, under the lock.
+        The file is replaced in one step, so a reader never sees a half written cache
+        """
+        with self.lock():
+            entries = self.load()
+            for ticker in self.removed:
+                entries.pop(ticker, None)
+            for ticker, section in self.changed:
+                if section in self.entries.get(ticker, {}):
+                    entries.setdefault(ticker, {})[section] = self.entries[ticker][section]
+            temporaryFile = "{}.{}".format(self.cacheFile, os.getpid())
+            with open(temporaryFile, 'w') as cache:
+                json.dump(entries, cache, separators=(',', ':'))
+            os.replace(temporaryFile, self.cacheFile)
+        self.entries = entries
+        self.changed = set()
+        self.removed = set()
+
+    def retain(self, tickers):
+        """
+        Removes the companies which are no longer listed
+
+        Args:
+            tickers (List): every listed ticker
+        """
+        for ticker in set(self.entries) - set(tickers):
+            del self.entries[ticker]
+            self.removed.add(ticker)
+
+    def parse(self, ticker, section, content, parser, version):
+        """
+        Parses content, unless it has the same hash as the content the cached result was parsed from, by the same version of the parser
+
+        Args:
+            ticker (String): The stock ticker the content belongs to
+            section (String): name of the section, e.g. 'Directors'
+            content (String or Bytes): the fetched page source
+            parser (Function): called with the content to parse it when it changed, must return a JSON serialisable result
+            version (String): version of the parser, see parser_version()
+
+        Returns:
+            (Object): the parsed result. Cached results are copied, as the caller may change them
+        """
+        contentHash = hash_content(content)
+        cached = self.entries.get(ticker, {}).get(section)
+        if cached is not None and cached.get('Hash') == contentHash and cached.get('Parser') == version:
+            self.hits[section] = self.hits.get(section, 0) + 1
+            logger.debug("%s %s unchanged, parse skipped", ticker, section)
+            return copy.deepcopy(cached['Result'])
+        self.misses[section] = self.misses.get(section, 0) + 1
+        result = parser(content)
+        self.entries.setdefault(ticker, {})[section] = {'Hash': contentHash, 'Parser': version, 'Result': copy.deepcopy(result)}
+        self.changed.add((ticker, section))
+        return result
+
+    def summary(self):
+        """
+        Logs the number of parses skipped and run for each section
+        """
+        for section in sorted(set(self.hits) | set(self.misses)):
+            logger.info("{} parses: {} skipped, {} run".format(section, self.hits.get(section, 0), self.misses.get(section, 0)))
+        hits = sum(self.hits.values())
+        total = hits + sum(self.misses.values())
+        if total:
+            logger.info("Parse cache hit rate: {:.0%}".format(hits / total))
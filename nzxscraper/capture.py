@@ -0,0 +1,112 @@
+"""
+Captures downloaded files in memory through the Chrome DevTools Protocol, instead of letting Chrome save them into the temp directory.
+"""
+from nzxscraper.environment import downloadDirectory, SPILL_BYTES, CAPTURE_MEMORY_BYTES, PAGE_LOAD_TIMEOUT
+from nzxscraper import logger
+import base64
+import json
+import os
+
+# Pdfs captured during the run, waiting to be sent by send_files_to_server()
+# Filename to the file content, or to the location it was spilled to if it was too large to keep in memory
+capturedFiles = {}
+
+def captured_bytes():
+    """
+    Returns:
+        (Int): total size of the captured files currently kept in memory
+    """
+    return sum(len(content) for content in capturedFiles.values() if isinstance(content, bytes))
+
+# Network buffers kept by Chrome for response bodies, large enough for an annual report
+maxResourceBufferSize = 100 * 1024 * 1024
+maxTotalBufferSize = 200 * 1024 * 1024
+
+fetchScript = """
+var done = arguments[arguments.length - 1];
+fetch(arguments[0], {credentials: 'include'})
+    .then(function(response) { return response.arrayBuffer().then(function() { done(response.status); }); })
+    .catch(function(error) { done(-1); });
+"""
+
+class DownloadCapture:
+    """
+    Requests a file with fetch() inside the page, so it uses the browser's login, then reads the response body
+    with Network.getResponseBody. The browser must have been created with performance logging, see get_browser().
+    """
+    def __init__(self, browser, spillBytes=SPILL_BYTES, memoryBytes=CAPTURE_MEMORY_BYTES):
+        self.browser = browser
+        self.spillBytes = spillBytes
+        self.memoryBytes = memoryBytes
+        browser.command_executor._commands["send_command_and_get_result"] = ("POST", '/session/$sessionId/chromium/send_command_and_get_result')
+        self.send_command('Network.enable', {'maxResourceBufferSize': maxResourceBufferSize, 'maxTotalBufferSize': maxTotalBufferSize})
+        browser.set_script_timeout(PAGE_LOAD_TIMEOUT)
+
+    def send_command(self, cmd, params):
+        """
+        Sends a DevTools command to the browser
+
+        Returns:
+            (Dict): the result of the command
+        """
+        return self.browser.execute("send_command_and_get_result", {'cmd': cmd, 'params': params})['value']
+
+    def find_request_id(self, url):
+        """
+        Reads the performance log written since the last call, and finds the id of the last request made to a url
+
+        Returns:
+            requestId (String): the DevTools request id, None if the request was not found
+        """
+        requestId = None
+        for entry in self.browser.get_log('performance'):
+            message = json.loads(entry['message'])['message']
+            if message['method'] == 'Network.requestWillBeSent' and message['params']['request']['url'] == url:
+                requestId = message['params']['requestId']
+        return requestId
+
+    def fetch(self, url):
+        """
+        Downloads a file into memory
+
+        Args:
+            url (String): url of the file
+
+        Returns:
+            content (Bytes): the response body, None if the request failed
+        """
+        status = self.browser.execute_async_script(fetchScript, url)
+        requestId = self.find_request_id(url)
+        if status != 200 or requestId is None:
+            logger.warning("Capture of {} failed with status {}".format(url, status))
+            return None
+        body = self.send_command('Network.getResponseBody', {'requestId': requestId})
+        content = base64.b64decode(body['body']) if body['base64Encoded'] else body['body'].encode('utf8')
+        logger.info("Captured {} bytes from {}".format(len(content), url))
+        return content
+
+    def capture_file(self, url, filename):
+        """
+        Downloads a file which is to be sent to the server, keeping it in capturedFiles.
+        Files larger than spillBytes, or which would take the files kept in memory past memoryBytes,
+        are written to the temp directory instead of being kept in memory.
+
+        Args:
+            url (String): url of the file
+            filename (String): name the file is sent to the server under
+
+        Returns:
+            (Bytes or String): the content, or the location of the spilled file. None if the request failed
+        """
+        content = self.fetch(url)
+        if content is None:
+            return None
+        if len(content) > self.spillBytes or captured_bytes() + len(content) > self.memoryBytes:
+            os.makedirs(downloadDirectory, exist_ok=True)
+            spillFile = os.path.join(downloadDirectory, filename)
+            with open(spillFile, 'wb') as spill:
+                spill.write(content)
+            capturedFiles[filename] = spillFile
+        else:
+            capturedFiles[filename] = content
+        return capturedFiles[filename]
@@ -0,0 +1,321 @@
+"""
+Cross-sectional analysis of the historical prices of every scraped company: correlation and covariance matrices,
+betas against a market cap weighted index of the scraped companies, and diversification metrics.
+
+The running sums behind the matrices are cached, so each run only adds the prices which arrived since each company's last refresh.
+"""
+from nzxscraper.environment import correlationCacheFile
+from nzxscraper import logger
+import numpy
+import os
+
+# Trading days kept for rolling statistics, and the length of the rolling beta window
+windowDays = 250
+rollingBetaDays = 60
+
+class MarketStatistics:
+    """
+    Keeps pairwise running sums of daily returns for every company, plus the market index as the last column.
+
+    For every pair (i, j) only the days on which both have a return are counted, so companies with shorter
+    histories or gaps in trading can be included without throwing away the days the others traded.
+
+    Companies are refreshed on different schedules (see RefreshScheduler), so each one adds its returns from its own last date.
+    The most recent windowDays rows stay open: when a company fills in days which are already in the sums, the old version
+    of those rows is taken out of the sums and the completed version, with its market return recalculated, is added back.
+
+    Attributes:
+        tickers (List): the companies, in column order
+        marketCaps (numpy.ndarray): latest market cap of each company, used to weight the index
+        lastDates (numpy.ndarray): last trading day of each company included in the sums
+        lastPrices (numpy.ndarray): price of each company on its last date, to calculate its next return
+        count, sums, squareSums, products (numpy.ndarray): (n + 1) x (n + 1) pairwise running sums
+        windowDates (numpy.ndarray), windowReturns (numpy.ndarray): the most recent windowDays rows of returns
+    """
+    def __init__(self, cacheFile=correlationCacheFile):
+        self.cacheFile = cacheFile
+        self.reset()
+        if os.path.isfile(cacheFile):
+            with numpy.load(cacheFile) as cache:
+                if 'lastDates' not in cache:
+                    logger.warning("Market statistics cache is from an older version, starting again")
+                    return
+                self.tickers = cache['tickers'].tolist()
+                self.marketCaps = cache['marketCaps']
+                self.lastDates = cache['lastDates']
+                self.lastPrices = cache['lastPrices']
+                self.count = cache['count']
+                self.sums = cache['sums']
+                self.squareSums = cache['squareSums']
+                self.products = cache['products']
+                self.windowDates = cache['windowDates']
+                self.windowReturns = cache['windowReturns']
+
+    def reset(self):
+        """
+        Empties the sums, leaving only the market index column
+        """
+        self.tickers = []
+        self.marketCaps = numpy.zeros(0)
+        self.lastDates = numpy.array([], dtype='datetime64[D]')
+        self.lastPrices = numpy.zeros(0)
+        self.count = numpy.zeros((1, 1))
+        self.sums = numpy.zeros((1, 1))
+        self.squareSums = numpy.zeros((1, 1))
+        self.products = numpy.zeros((1, 1))
+        self.windowDates = numpy.array([], dtype='datetime64[D]')
+        self.windowReturns = numpy.zeros((0, 1))
+
+    def save(self):
+        """
+        Writes the sums to disk for the next run
+        """
+        numpy.savez(self.cacheFile, tickers=numpy.array(self.tickers, dtype=str), marketCaps=self.marketCaps,
+                    lastDates=self.lastDates, lastPrices=self.lastPrices, count=self.count, sums=self.sums,
+                    squareSums=self.squareSums, products=self.products, windowDates=self.windowDates, windowReturns=self.windowReturns)
+
+    def add_tickers(self, tickers, marketCaps):
+        """
+        Adds empty columns for new companies, just before the market index column
+
+        Args:
+            tickers (List): the new companies
+            marketCaps (List): market cap of each new company
+        """
+        position = len(self.tickers)
+        added = len(tickers)
+        self.tickers.extend(tickers)
+        self.marketCaps = numpy.concatenate([self.marketCaps, numpy.asarray(marketCaps, dtype=numpy.float64)])
+        self.lastDates = numpy.concatenate([self.lastDates, numpy.full(added, numpy.datetime64('NaT', 'D'))])
+        self.lastPrices = numpy.concatenate([self.lastPrices, numpy.full(added, numpy.nan)])
+        for name in ('count', 'sums', 'squareSums', 'products'):
+            matrix = getattr(self, name)
+            matrix = numpy.insert(matrix, [position] * added, 0, axis=0)
+            setattr(self, name, numpy.insert(matrix, [position] * added, 0, axis=1))
+        self.windowReturns = numpy.insert(self.windowReturns, [position] * added, numpy.nan, axis=1)
+
+    def retain(self, tickers):
+        """
+        Removes the companies which are no longer listed
+
+        Args:
+            tickers (List): every listed ticker
+        """
+        keep = [column for column, ticker in enumerate(self.tickers) if ticker in set(tickers)]
+        if len(keep) == len(self.tickers):
+            return
+        matrixKeep = keep + [len(self.tickers)]
+        self.tickers = [self.tickers[column] for column in keep]
+        self.marketCaps = self.marketCaps[keep]
+        self.lastDates = self.lastDates[keep]
+        self.lastPrices = self.lastPrices[keep]
+        for name in ('count', 'sums', 'squareSums', 'products'):
+            setattr(self, name, getattr(self, name)[numpy.ix_(matrixKeep, matrixKeep)])
+        self.windowReturns = self.windowReturns[:, matrixKeep]
+
+    def accumulate(self, rows, sign=1):
+        """
+        Adds rows of returns to the pairwise running sums, or takes them out again with sign=-1.
+        For every pair only the rows in which both columns have a return are counted
+        """
+        mask = (~numpy.isnan(rows)).astype(numpy.float64)
+        zeroed = numpy.nan_to_num(rows)
+        self.count += sign * (mask.T @ mask)
+        self.sums += sign * (zeroed.T @ mask)
+        self.squareSums += sign * ((zeroed ** 2).T @ mask)
+        self.products += sign * (zeroed.T @ zeroed)
+
+    def market_returns(self, returns):
+        """
+        Calculates the market cap weighted return of the companies which have a return in each row
+
+        Args:
+            returns (numpy.ndarray): one row per date, one column per company
+
+        Returns:
+            (numpy.ndarray): the market return of each row, NaN for rows without any returns
+        """
+        weights = numpy.where(~numpy.isnan(returns), self.marketCaps, 0)
+        weightTotals = weights.sum(axis=1)
+        return numpy.where(weightTotals > 0, (numpy.nan_to_num(returns) * weights).sum(axis=1) / numpy.where(weightTotals > 0, weightTotals, 1), numpy.nan)
+
+    def new_returns(self, column, series):
+        """
+        Calculates the returns of a company after its last date, and moves its last date and price forward
+
+        Returns:
+            dates (numpy.ndarray): trading days of the new returns
+            returns (numpy.ndarray): return on each of those days, from the previous trading day of the company
+        """
+        lastDate = self.lastDates[column]
+        if numpy.isnat(lastDate):
+            # A new company, its first price has no previous price to calculate a return from
+            dates = series.dates[1:]
+            returns = series.last[1:] / series.last[:-1] - 1
+        else:
+            new = series.dates > lastDate
+            if not new.any():
+                return series.dates[:0], series.last[:0]
+            first = numpy.argmax(new)
+            # The price before the new days, from this run's prices if they still reach back that far
+            previousPrice = series.last[first - 1] if first > 0 else self.lastPrices[column]
+            prices = numpy.concatenate([[previousPrice], series.last[new]])
+            dates = series.dates[new]
+            returns = prices[1:] / prices[:-1] - 1
+        if len(series):
+            self.lastDates[column] = series.dates[-1]
+            self.lastPrices[column] = series.last[-1]
+        returns = numpy.where(numpy.isfinite(returns), returns, numpy.nan)
+        return dates, returns
+
+    def add_prices(self, seriesByTicker):
+        """
+        Turns the prices each company has after its own last date into returns, aligns them on a common calendar with the open rows,
+        and updates the sums
+
+        Args:
+            seriesByTicker (Dict): ticker to PriceSeries, companies without new prices can be left out
+        """
+        columns = {ticker: column for column, ticker in enumerate(self.tickers)}
+        # Once rows have been closed, days older than the open rows can no longer be paired with the other companies
+        windowStart = self.windowDates[0] if len(self.windowDates) >= windowDays else None
+        updates = []
+        for ticker, series in seriesByTicker.items():
+            dates, returns = self.new_returns(columns[ticker], series)
+            if windowStart is not None:
+                dates, returns = dates[dates >= windowStart], returns[dates >= windowStart]
+            if len(dates):
+                updates.append((columns[ticker], dates, returns))
+        if not updates:
+            logger.info("No new prices for market statistics")
+            return
+
+        # Open rows and new days on one calendar
+        dates = numpy.union1d(self.windowDates, numpy.concatenate([updateDates for column, updateDates, returns in updates]))
+        rows = numpy.full((len(dates), len(self.tickers) + 1), numpy.nan)
+        openRows = numpy.searchsorted(dates, self.windowDates)
+        rows[openRows] = self.windowReturns
+        changed = numpy.zeros(len(dates), dtype=bool)
+        for column, updateDates, returns in updates:
+            positions = numpy.searchsorted(dates, updateDates)
+            rows[positions, column] = returns
+            changed[positions] = True
+
+        # Replace the changed rows in the sums, with their market return recalculated from every company now in the row
+        self.accumulate(self.windowReturns[changed[openRows]], -1)
+        rows[changed, -1] = self.market_returns(rows[changed, :-1])
+        self.accumulate(rows[changed])
+
+        self.windowDates = dates[-windowDays:]
+        self.windowReturns = rows[-windowDays:]
+        logger.info("Added returns on {} days for {} companies".format(int(changed.sum()), len(updates)))
+
+    def covariance(self):
+        """
+        Returns:
+            covariance (numpy.ndarray): pairwise sample covariance, companies then the market index
+            correlation (numpy.ndarray): pairwise correlation, over the same days as the covariance
+        """
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            count = numpy.where(self.count > 1, self.count, numpy.nan)
+            covariance = (self.products - self.sums * self.sums.T / count) / (count - 1)
+            # Variance of each column over the days shared with the other column
+            variance = (self.squareSums - self.sums ** 2 / count) / (count - 1)
+            correlation = covariance / numpy.sqrt(variance * variance.T)
+        return covariance, correlation
+
+    def rolling_betas(self):
+        """
+        Calculates the beta of every company against the market index over every rollingBetaDays window within the cached window
+
+        Returns:
+            (numpy.ndarray): one row per window end date, one column per company
+        """
+        returns = self.windowReturns
+        if len(returns) < rollingBetaDays:
+            return numpy.full((0, len(self.tickers)), numpy.nan)
+        market = returns[:, -1:]
+        mask = (~numpy.isnan(returns[:, :-1]) & ~numpy.isnan(market)).astype(numpy.float64)
+        companies = numpy.nan_to_num(returns[:, :-1]) * mask
+        market = numpy.nan_to_num(market) * mask
+
+        def rolling_sum(values):
+            cumulative = numpy.vstack([numpy.zeros((1, values.shape[1])), numpy.cumsum(values, axis=0)])
+            return cumulative[rollingBetaDays:] - cumulative[:-rollingBetaDays]
+
+        count = rolling_sum(mask)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            covariance = rolling_sum(companies * market) - rolling_sum(companies) * rolling_sum(market) / count
+            variance = rolling_sum(market ** 2) - rolling_sum(market) ** 2 / count
+            return numpy.where(count > 1, covariance / variance, numpy.nan)
+
+    def diversification(self, covariance, correlation):
+        """
+        Calculates diversification metrics of the market cap weighted portfolio of the scraped companies
+
+        Returns:
+            (Dict): 'Diversification Ratio' (weighted volatility over portfolio volatility),
+                    'Average Correlation' (mean of the pairwise correlations),
+                    'Effective Bets' (exponential of the entropy of the correlation eigenvalues)
+        """
+        companyCovariance = numpy.nan_to_num(covariance[:-1, :-1])
+        weights = self.marketCaps / self.marketCaps.sum()
+        volatility = numpy.sqrt(numpy.diag(companyCovariance))
+        portfolioVolatility = numpy.sqrt(weights @ companyCovariance @ weights)
+
+        companyCorrelation = numpy.nan_to_num(correlation[:-1, :-1])
+        numpy.fill_diagonal(companyCorrelation, 1)
+        offDiagonal = ~numpy.eye(len(self.tickers), dtype=bool)
+        eigenvalues = numpy.clip(numpy.linalg.eigvalsh(companyCorrelation), 0, None)
+        shares = eigenvalues[eigenvalues > 0] / eigenvalues.sum()
+        return {
+                    'Diversification Ratio': float(weights @ volatility / portfolioVolatility) if portfolioVolatility > 0 else None,
+                    'Average Correlation': float(numpy.nanmean(correlation[:-1, :-1][offDiagonal])) if offDiagonal.any() else None,
+                    'Effective Bets': float(numpy.exp(-(shares * numpy.log(shares)).sum())),
+               }
+
+    def update(self, stockDataArray):
+        """
+        Adds the new prices of the scraped companies, then stores each company's betas and average correlation in its Ratio section.
+        The new sums are only kept for the next run once save() is called
+
+        Args:
+            stockDataArray (List): dictionary of all scraped company information
+
+        Returns:
+            (Dict): diversification metrics, see diversification()
+        """
+        seriesByTicker = {stock['Summary']['Ticker']: stock['HistoricalPrices'] for stock in stockDataArray if 'HistoricalPrices' in stock}
+        marketCaps = {stock['Summary']['Ticker']: stock['Summary']['Market Cap'] for stock in stockDataArray}
+        if not seriesByTicker and not self.tickers:
+            return {}
+
+        # New companies get their own columns, the other companies keep their sums
+        newTickers = sorted(ticker for ticker in seriesByTicker if ticker not in self.tickers)
+        if newTickers:
+            logger.info("Adding {} companies to the market statistics".format(len(newTickers)))
+            self.add_tickers(newTickers, [marketCaps.get(ticker, 0) for ticker in newTickers])
+        for column, ticker in enumerate(self.tickers):
+            if ticker in marketCaps:
+                self.marketCaps[column] = marketCaps[ticker]
+        self.add_prices(seriesByTicker)
+
+        covariance, correlation = self.covariance()
+        betas = covariance[:-1, -1] / covariance[-1, -1]
+        rollingBetas = self.rolling_betas()
+        with numpy.errstate(invalid='ignore'):
+            averageCorrelations = numpy.nanmean(numpy.where(numpy.eye(len(self.tickers) + 1, dtype=bool), numpy.nan, correlation)[:-1, :-1], axis=1) if len(self.tickers) > 1 else numpy.full(len(self.tickers), numpy.nan)
+        columns = {ticker: column for column, ticker in enumerate(self.tickers)}
+        for stock in stockDataArray:
+            column = columns.get(stock['Summary']['Ticker'])
+            if column is None or 'Ratio' not in stock:
+                continue
+            for name, value in (('Market Beta', betas[column]),
+                                ('Rolling Beta', rollingBetas[-1, column] if len(rollingBetas) else numpy.nan),
+                                ('Average Correlation', averageCorrelations[column])):
+                if numpy.isfinite(value):
+                    stock['Ratio'][name] = float(value)
+
+        metrics = self.diversification(covariance, correlation)
+        logger.info("Market statistics: {}".format(metrics))
+        return metrics
@@ -0,0 +1,135 @@
+"""
+Functions used to reduce each upload to only the records that changed since the last successful upload.
+"""
+from nzxscraper.environment import snapshotFile
+from nzxscraper import logger
+from hashlib import blake2b
+import json
+import os
+
+# Sections scraped over a rolling date window. Records older than the window were not removed, they were simply not scraped
+windowedSections = ('HistoricalPrices',)
+
+def hash_record(record):
+    """
+    Creates a short, stable hash of a scraped record so it can be compared between runs
+
+    Args:
+        record (Object): Any JSON serialisable value (dict, list, string, number)
+
+    Returns:
+        (String): 16 character hex digest of the record
+    """
+    recordString = json.dumps(record, sort_keys=True, default=str)
+    return blake2b(recordString.encode('utf8'), digest_size=8).hexdigest()
+
+def load_snapshot_hashes():
+    """
+    Reads the hashes of the last snapshot which was successfully sent to the server
+
+    Returns:
+        (Dict): {'Date': timestamp, 'Tickers': {ticker: {section: {key: hash}}}}, or None if there is no previous snapshot
+    """
+    if not os.path.isfile(snapshotFile):
+        logger.info("No previous snapshot found, a full snapshot will be sent")
+        return None
+    try:
+        with open(snapshotFile, 'r') as snapshot:
+            return json.load(snapshot)
+    except ValueError:
+        logger.warning("Previous snapshot is unreadable, a full snapshot will be sent")
+        return None
+
+def save_snapshot_hashes(snapshotHashes):
+    """
+    Stores the hashes of the snapshot which was just sent, to be used as the base of the next delta
+
+    Args:
+        snapshotHashes (Dict): hashes created by build_delta()
+    """
+    with open(snapshotFile, 'w') as snapshot:
+        json.dump(snapshotHashes, snapshot, separators=(',', ':'))
+    logger.info("Snapshot hashes saved to " + snapshotFile)
+
+def build_delta(scrapeInsert, currentTimeStamp, previousHashes, universe=None, partial=None):
+    """
+    Compares every record of every company section with the previous snapshot.
+    Only added or changed records are kept, and a manifest is added describing what was sent and what was removed.
+    The manifest is a top level field next to the snapshot, so consumers iterating the tickers never see it.
+
+    Each section of a company is a dictionary, so each key within it is treated as a record
+    (a trading day for HistoricalPrices, a director for Directors, a heading for Profile etc.)
+
+    Args:
+        scrapeInsert (Dict): full snapshot built by save_data()
+        currentTimeStamp (String): the key of the current scrape within scrapeInsert
+        previousHashes (Dict): hashes of the previous snapshot from load_snapshot_hashes(), None to send everything
+        universe (List): [Optional] every ticker still listed. Companies and sections which were not scraped this run
+                         keep their previous hashes, only companies outside the universe are dropped
+        partial (Dict): [Optional] ticker to the sections which only hold some of their records this run,
+                        e.g. the new score of a company which was not scraped. Their other records keep their previous hashes
+
+    Returns:
+        deltaInsert (Dict): {currentTimeStamp: snapshot containing only changed records, 'Manifest': manifest}
+        snapshotHashes (Dict): hashes of the full current snapshot, to be saved once the delta is sent
+    """
+    previousTickers = previousHashes['Tickers'] if previousHashes else {}
+    snapshotHashes = {'Date': currentTimeStamp, 'Tickers': {}}
+    manifest = {
+                    'Mode': 'delta' if previousHashes else 'full',
+                    'Base': previousHashes['Date'] if previousHashes else None,
+                    'Tickers': {}
+                }
+    deltaInsert = {currentTimeStamp: {'Date': currentTimeStamp}}
+
+    for ticker, stockInsert in scrapeInsert[currentTimeStamp].items():
+        if ticker == 'Date':
+            continue
+        previousSections = previousTickers.get(ticker, {})
+        partialSections = (partial or {}).get(ticker, ())
+        tickerHashes = {}
+        tickerManifest = {}
+        stockDelta = {}
+
+        for sectionKey, sectionInsert in stockInsert.items():
+            previousRecords = previousSections.get(sectionKey, {})
+            isPartial = sectionKey in partialSections
+            sectionHashes = dict(previousRecords) if isPartial else {}
+            sectionDelta = {}
+            for recordKey, record in sectionInsert.items():
+                recordHash = hash_record(record)
+                sectionHashes[recordKey] = recordHash
+                if previousRecords.get(recordKey) != recordHash:
+                    sectionDelta[recordKey] = record
+            removed = [] if isPartial else [recordKey for recordKey in previousRecords if recordKey not in sectionHashes]
+            if sectionKey in windowedSections:
+                # Dates which fell off the start of the window are still valid history
+                windowStart = min(sectionHashes) if sectionHashes else None
+                removed = [recordKey for recordKey in removed if windowStart is not None and recordKey >= windowStart]
+
+            tickerHashes[sectionKey] = sectionHashes
+            if sectionDelta:
+                stockDelta[sectionKey] = sectionDelta
+            if sectionDelta or removed:
+                tickerManifest[sectionKey] = {'Changed': len(sectionDelta), 'Removed': removed, 'Records': len(sectionHashes)}
+
+        # Sections which were not due this run are unchanged
+        for sectionKey, previousRecords in previousSections.items():
+            if sectionKey not in stockInsert:
+                tickerHashes[sectionKey] = previousRecords
+
+        snapshotHashes['Tickers'][ticker] = tickerHashes
+        if stockDelta:
+            deltaInsert[currentTimeStamp][ticker] = stockDelta
+        if tickerManifest:
+            manifest['Tickers'][ticker] = tickerManifest
+
+    # Companies which are no longer listed are reported so the server can decide what to do with them
+    universe = set(universe if universe is not None else snapshotHashes['Tickers'])
+    manifest['Dropped'] = [ticker for ticker in previousTickers if ticker not in universe]
+    for ticker, previousSections in previousTickers.items():
+        if ticker in universe and ticker not in snapshotHashes['Tickers']:
+            snapshotHashes['Tickers'][ticker] = previousSections
+    deltaInsert['Manifest'] = manifest
+    logger.info("Delta built against {}: {} of {} companies changed".format(manifest['Base'], len(manifest['Tickers']), len(snapshotHashes['Tickers'])))
+    return deltaInsert, snapshotHashes
@@ -0,0 +1,256 @@
+"""
+Work queue used to share the companies of a run between any number of scraping workers.
+A worker leases a company for a limited time, so the company goes back to the queue if the worker dies.
+"""
+from nzxscraper.environment import queueDatabaseFile, MAX_ATTEMPTS
+from nzxscraper.prices import PriceSeries, DividendSeries
+from nzxscraper import logger
+from abc import ABC, abstractmethod
+from time import time
+import sqlite3
+import json
+
+def encode_result(stockData):
+    """
+    Converts scraped company data to JSON, so results can cross between machines without trusting the sender
+
+    Args:
+        stockData (Dict): dictionary of the fetched sections
+
+    Returns:
+        (String): JSON text, with the price and dividend series converted by their to_dict()
+    """
+    encoded = dict(stockData)
+    if 'HistoricalPrices' in encoded:
+        encoded['HistoricalPrices'] = encoded['HistoricalPrices'].to_dict()
+    if encoded.get('HistoricalDividends') is not None:
+        encoded['HistoricalDividends'] = encoded['HistoricalDividends'].to_dict()
+    return json.dumps(encoded)
+
+def decode_result(resultText):
+    """
+    Converts JSON made by encode_result() back to scraped company data
+
+    Args:
+        resultText (String): JSON text
+
+    Returns:
+        stockData (Dict): dictionary of the fetched sections
+    """
+    stockData = json.loads(resultText)
+    if 'HistoricalPrices' in stockData:
+        stockData['HistoricalPrices'] = PriceSeries.from_dict(stockData['HistoricalPrices'])
+    if stockData.get('HistoricalDividends') is not None:
+        stockData['HistoricalDividends'] = DividendSeries.from_dict(stockData['HistoricalDividends'])
+    return stockData
+
+class WorkItem:
+    """
+    A company to be scraped as part of a run
+
+    Attributes:
+        run (String): the run the item belongs to
+        ticker (String): The stock ticker to scrape
+        rank (Int): market cap rank of the company, see MarketCapRanking. Lower ranks are claimed first
+        sections (Set): sections to fetch, see RefreshScheduler
+        attempts (Int): number of times the item has been leased
+        link (String): url of the company summary page, None to find the company on the Market Overview
+    """
+    def __init__(self, run, ticker, rank, sections, attempts=0, link=None):
+        self.run = run
+        self.ticker = ticker
+        self.rank = rank
+        self.sections = set(sections)
+        self.attempts = attempts
+        self.link = link
+
+    def __str__(self):
+        return "{} ({}, attempt {})".format(self.ticker, self.run, self.attempts)
+
+class WorkQueue(ABC):
+    """
+    Interface of the store behind the work queue. Implementations must make claim() atomic across processes and nodes.
+    """
+    @abstractmethod
+    def publish(self, run, items):
+        """
+        Adds the items of a run to the queue
+
+        Args:
+            run (String): identifier of the run
+            items (List): WorkItem for every company in the run
+        """
+
+    @abstractmethod
+    def claim(self, worker, leaseSeconds):
+        """
+        Leases the next queued item to a worker. Items with an expired lease are queued again first.
+
+        Args:
+            worker (String): identifier of the worker
+            leaseSeconds (Int): how long the worker has to complete the item
+
+        Returns:
+            (WorkItem): the leased item, None if nothing is queued
+        """
+
+    @abstractmethod
+    def complete(self, item, worker, result):
+        """
+        Stores the result of an item, if the worker still holds its lease
+
+        Args:
+            item (WorkItem): the leased item
+            worker (String): identifier of the worker
+            result (Dict): the scraped company data
+
+        Returns:
+            (Boolean): False if the lease had expired and the result was discarded
+        """
+
+    @abstractmethod
+    def fail(self, item, worker, error):
+        """
+        Gives an item back to the queue, or marks it as failed once it has used all its attempts
+
+        Args:
+            item (WorkItem): the leased item
+            worker (String): identifier of the worker
+            error (String): why the item failed
+        """
+
+    @abstractmethod
+    def pending(self, run=None):
+        """
+        Counts the items which are queued or leased. Items with an expired lease are queued again first,
+        so the count falls to zero even if every worker has died
+
+        Args:
+            run (String): [Optional] only count items of this run
+
+        Returns:
+            (Int): number of unfinished items
+        """
+
+    @abstractmethod
+    def abandon(self, run, error):
+        """
+        Marks every unfinished item of a run as failed, e.g. when the run has passed its deadline
+
+        Args:
+            run (String): identifier of the run
+            error (String): why the items failed
+
+        Returns:
+            (Int): number of items marked as failed
+        """
+
+    @abstractmethod
+    def results(self, run):
+        """
+        Reads back the results of a run
+
+        Args:
+            run (String): identifier of the run
+
+        Returns:
+            (List): (WorkItem, result) for every completed item, in rank order
+        """
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    Work queue stored in a SQLite database, for workers running on one machine or sharing a file system.
+    """
+    def __init__(self, databasePath=queueDatabaseFile, maxAttempts=MAX_ATTEMPTS):
+        self.maxAttempts = maxAttempts
+        # isolation_level=None lets claim() take the write lock up front with BEGIN IMMEDIATE
+        self.connection = sqlite3.connect(databasePath, timeout=30, isolation_level=None)
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS work (
+                run TEXT NOT NULL, ticker TEXT NOT NULL, rank INTEGER NOT NULL, sections TEXT NOT NULL,
+                status TEXT NOT NULL, worker TEXT, lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT, result TEXT, link TEXT,
+                PRIMARY KEY (run, ticker)
+            )''')
+        # Queues created before company links were stored
+        if 'link' not in [column[1] for column in self.connection.execute("PRAGMA table_info(work)")]:
+            self.connection.execute("ALTER TABLE work ADD COLUMN link TEXT")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS work_by_status ON work (status, run, rank)")
+
+    def publish(self, run, items):
+        with self.connection:
+            self.connection.execute("BEGIN")
+            self.connection.executemany("INSERT OR REPLACE INTO work (run, ticker, rank, sections, status, link) VALUES (?, ?, ?, ?, 'queued', ?)",
+                                        [(run, item.ticker, item.rank, json.dumps(sorted(item.sections)), item.link) for item in items])
+        logger.info("Published {} companies for run {}".format(len(items), run))
+
+    def requeue_expired(self, now):
+        """
+        Queues the items whose lease has expired again, or fails them if they have used all their attempts.
+        Must be called within a transaction
+        """
+        failed = self.connection.execute("UPDATE work SET status = 'failed', worker = NULL, error = 'Lease expired' WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                                         (now, self.maxAttempts)).rowcount
+        expired = self.connection.execute("UPDATE work SET status = 'queued', worker = NULL WHERE status = 'leased' AND lease_expires < ?", (now,)).rowcount
+        if failed or expired:
+            logger.warning("{} expired leases returned to the queue, {} failed".format(expired, failed))
+
+    def claim(self, worker, leaseSeconds):
+        now = time()
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            self.requeue_expired(now)
+            row = self.connection.execute("SELECT run, ticker, rank, sections, attempts, link FROM work WHERE status = 'queued' ORDER BY run, rank LIMIT 1").fetchone()
+            if row is None:
+                self.connection.execute("COMMIT")
+                return None
+            run, ticker, rank, sections, attempts, link = row
+            self.connection.execute("UPDATE work SET status = 'leased', worker = ?, lease_expires = ?, attempts = ? WHERE run = ? AND ticker = ?",
+                                    (worker, now + leaseSeconds, attempts + 1, run, ticker))
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+        return WorkItem(run, ticker, rank, json.loads(sections), attempts + 1, link)
+
+    def complete(self, item, worker, result):
+        with self.connection:
+            self.connection.execute("BEGIN")
+            updated = self.connection.execute("UPDATE work SET status = 'done', result = ?, lease_expires = NULL WHERE run = ? AND ticker = ? AND worker = ? AND status = 'leased'",
+                                              (encode_result(result), item.run, item.ticker, worker)).rowcount
+        if not updated:
+            logger.warning("Lease on {} was lost, result discarded".format(item))
+        return bool(updated)
+
+    def fail(self, item, worker, error):
+        status = 'failed' if item.attempts >= self.maxAttempts else 'queued'
+        with self.connection:
+            self.connection.execute("BEGIN")
+            self.connection.execute("UPDATE work SET status = ?, worker = NULL, lease_expires = NULL, error = ? WHERE run = ? AND ticker = ? AND worker = ? AND status = 'leased'",
+                                    (status, error, item.run, item.ticker, worker))
+        logger.warning("{} {}: {}".format(item, status, error))
+
+    def pending(self, run=None):
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.requeue_expired(time())
+        query = "SELECT COUNT(*) FROM work WHERE status IN ('queued', 'leased')"
+        parameters = ()
+        if run is not None:
+            query += " AND run = ?"
+            parameters = (run,)
+        return self.connection.execute(query, parameters).fetchone()[0]
+
+    def abandon(self, run, error):
+        with self.connection:
+            self.connection.execute("BEGIN")
+            abandoned = self.connection.execute("UPDATE work SET status = 'failed', worker = NULL, lease_expires = NULL, error = ? WHERE run = ? AND status IN ('queued', 'leased')",
+                                                (error, run)).rowcount
+        if abandoned:
+            logger.error("{} companies of run {} abandoned: {}".format(abandoned, run, error))
+        return abandoned
+
+    def results(self, run):
+        rows = self.connection.execute("SELECT run, ticker, rank, sections, attempts, link, result FROM work WHERE run = ? AND status = 'done' ORDER BY rank", (run,))
+        return [(WorkItem(run, ticker, rank, json.loads(sections), attempts, link), decode_result(result))
+                for run, ticker, rank, sections, attempts, link, result in rows]
@@ -9,7 +9,8 @@ dirname = os.getcwd()
 username = os.environ.get('USERNAME')
 password = os.environ.get('PASSWORD')
 DEBUG = os.environ.get('DEBUG')
-COMPANIES = int(os.environ.get('COMPANIES'))
+# Optional limit on the number of companies listed, every listed company is scraped if not set
+COMPANIES = int(os.environ['COMPANIES']) if os.environ.get('COMPANIES') else None
 
 downloadDirectory = str(Path(os.path.join(dirname, 'temp')))
 tempDirectory = str(Path(r"temp/a"))[:-1]
@@ -17,3 +18,56 @@ if platform.system() is "Windows":
     chromeDriverLocation = r"C:\Users\Kiran\Documents\GitHub\ScraperHeroku\chromedriver.exe"
 else:
     chromeDriverLocation = "/app/.chromedriver/bin/chromedriver"
+
+# Hashes of the last snapshot sent to the server, used to only upload changes
+snapshotFile = str(Path(os.path.join(dirname, 'snapshot_hashes.json')))
+FULL_SNAPSHOT = os.environ.get('FULL_SNAPSHOT')
+
+# pandas.read_csv engine for the historical csv files, 'pyarrow' requires pandas >= 1.4 and pyarrow
+CSV_ENGINE = os.environ.get('CSV_ENGINE', 'c')
+
+# Latest annual report link of each company, valid until the next reporting season
+annualReportCacheFile = str(Path(os.path.join(dirname, 'annual_reports.json')))
+
+# Extracted tearsheet and annual report contents, one file per pdf content hash
+pdfCacheDirectory = str(Path(os.path.join(dirname, 'pdf_cache')))
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', os.cpu_count() or 1))
+
+# SQLite store holding the history of every scrape
+databaseFile = str(Path(os.path.join(dirname, 'nzx.db')))
+
+# Scoring metric values of every company, kept between runs for incremental scoring
+scoringStateFile = str(Path(os.path.join(dirname, 'scoring_state.json')))
+
+# Refresh schedule of every (ticker, section) pair
+scheduleFile = str(Path(os.path.join(dirname, 'schedule.json')))
+# Companies ranked below TOP_TIER by market cap are refreshed at most weekly
+TOP_TIER = int(os.environ.get('TOP_TIER', 20))
+FULL_REFRESH = os.environ.get('FULL_REFRESH')
+
+# Work queue shared by the coordinator and workers in distributed mode
+queueDatabaseFile = str(Path(os.path.join(dirname, 'work_queue.db')))
+LEASE_SECONDS = int(os.environ.get('LEASE_SECONDS', 600))
+# Seconds the coordinator waits for a run, after which unfinished companies are marked as failed
+RUN_DEADLINE = int(os.environ.get('RUN_DEADLINE', 6 * 60 * 60))
+MAX_ATTEMPTS = int(os.environ.get('MAX_ATTEMPTS', 3))
+
+# Time limits, in seconds, which stop one company from holding up the run
+COMPANY_DEADLINE = int(os.environ.get('COMPANY_DEADLINE', 300))
+PAGE_LOAD_TIMEOUT = int(os.environ.get('PAGE_LOAD_TIMEOUT', 60))
+ELEMENT_WAIT = int(os.environ.get('ELEMENT_WAIT', 15))
+# Number of times companies which failed are retried at the end of the run
+MAX_RETRIES = int(os.environ.get('MAX_RETRIES', 2))
+
+# Capture downloads in memory through DevTools instead of saving them into the temp directory
+DOWNLOAD_CAPTURE = os.environ.get('DOWNLOAD_CAPTURE')
+# Captured files larger than this are written to the temp directory instead of being kept in memory
+SPILL_BYTES = int(os.environ.get('SPILL_BYTES', 20 * 1024 * 1024))
+# Total size of the captured files kept in memory, once reached every further file is written to the temp directory
+CAPTURE_MEMORY_BYTES = int(os.environ.get('CAPTURE_MEMORY_BYTES', 50 * 1024 * 1024))
+
+# Running sums behind the correlation, covariance and beta matrices
+correlationCacheFile = str(Path(os.path.join(dirname, 'market_statistics.npz')))
+
+# Parsed sections of every company with the hash of the page or csv they were parsed from
+parseCacheFile = str(Path(os.path.join(dirname, 'parse_cache.json')))
@@ -0,0 +1,254 @@
+"""
+Functions related to extracting text, tables and key figures from the downloaded tearsheets and annual reports.
+Extraction runs in a pool of processes so it never blocks the scraping loop.
+"""
+from nzxscraper.environment import pdfCacheDirectory, PDF_WORKERS
+from nzxscraper import logger
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha256
+from io import BytesIO
+from time import sleep, time
+import json
+import os
+import re
+
+try:
+    import pdfplumber
+except ImportError:
+    pdfplumber = None
+
+# Annual reports can be hundreds of pages long, the figures we want are near the front
+maxPages = 40
+# Time allowed for Chrome to download a pdf, counted from when it was queued
+downloadTimeout = 120 # seconds
+
+# Labels of the figures pulled out of the report text, and the tables they appear in
+keyFigureLabels = {
+                    'Revenue': r'(?:total )?(?:operating )?revenue',
+                    'Net Profit': r'net (?:profit|surplus|income)(?: after tax)?',
+                    'Total Assets': r'total assets',
+                    'Total Equity': r'total equity',
+                    'Earnings per Share': r'(?:basic )?earnings per share',
+                    'Dividend per Share': r'dividends? per share',
+                    'Operating Cash Flow': r'net cash (?:flows? )?from operating activities',
+                  }
+numberPattern = r'[\s:$]*(\()?\$?(-?\d[\d,]*(?:\.\d+)?)\)?\s*(million|billion|cents|bn|m|k|c)?\b'
+keyFigurePatterns = {name: re.compile(r'\b' + label + numberPattern, re.IGNORECASE) for name, label in keyFigureLabels.items()}
+# Fields of an extraction which are uploaded in the Reports section, the full text is only kept in the pdf cache
+reportFields = ('Pages', 'Tables', 'Figures', 'Hash')
+
+def is_downloaded(pdfFile):
+    """
+    Checks whether Chrome has finished downloading a file
+
+    Args:
+        pdfFile (String): Location where the file will be saved
+
+    Returns:
+        (Boolean): True if the file is ready to be read
+    """
+    return os.path.isfile(pdfFile) and not os.path.isfile(pdfFile + '.crdownload')
+
+def wait_for_download(pdfFile, timeout=downloadTimeout):
+    """
+    Waits for Chrome to finish downloading a file
+
+    Args:
+        pdfFile (String): Location where the file will be saved
+        timeout (Int): [Optional] seconds to wait before giving up
+
+    Returns:
+        (Boolean): True if the file is ready to be read
+    """
+    deadline = time() + timeout
+    while not is_downloaded(pdfFile):
+        if time() >= deadline:
+            return False
+        sleep(0.5)
+    return True
+
+def find_key_figures(text):
+    """
+    Finds the first value reported for each key figure in the text of a report
+
+    Args:
+        text (String): text of the report
+
+    Returns:
+        figures (Dict): key figure name to {'Value': Float, 'Unit': String}
+    """
+    figures = {}
+    for name, pattern in keyFigurePatterns.items():
+        match = pattern.search(text)
+        if match:
+            value = float(match.group(2).replace(',', ''))
+            # Bracketed numbers are negative in financial statements
+            if match.group(1):
+                value = -abs(value)
+            figures[name] = {'Value': value, 'Unit': (match.group(3) or '').lower()}
+    return figures
+
+def is_key_table(table):
+    """
+    Checks whether any cell of a table contains one of the key figure labels
+
+    Args:
+        table (List): rows of cells as extracted by pdfplumber
+
+    Returns:
+        (Boolean): True if the table should be kept
+    """
+    for row in table:
+        for cell in row:
+            if cell and any(re.search(label, cell, re.IGNORECASE) for label in keyFigureLabels.values()):
+                return True
+    return False
+
+def extract_pdf(pdfContent):
+    """
+    Parses a pdf into its text, the tables containing key figures, and the key figures themselves
+
+    Args:
+        pdfContent (Bytes): the pdf file
+
+    Returns:
+        (Dict): {'Pages': Int, 'Text': String, 'Tables': List, 'Figures': Dict}
+    """
+    pageTexts = []
+    tables = []
+    with pdfplumber.open(BytesIO(pdfContent)) as pdf:
+        pageCount = len(pdf.pages)
+        for page in pdf.pages[:maxPages]:
+            pageTexts.append(page.extract_text() or '')
+            tables.extend(table for table in page.extract_tables() if is_key_table(table))
+    text = '\n'.join(pageTexts)
+    return {'Pages': pageCount, 'Text': text, 'Tables': tables, 'Figures': find_key_figures(text)}
+
+def extract_pdf_cached(pdfFile, cacheDirectory):
+    """
+    Runs in a worker process. Returns the cached extraction for the pdf content if there is one,
+    otherwise extracts the pdf and caches the result under the sha256 of its content.
+    The cache keeps the full text, only the reportFields are returned.
+
+    Args:
+        pdfFile (String or Bytes): Location of a downloaded file, or the content of a file captured in memory
+        cacheDirectory (String): directory holding one json file per extracted pdf
+
+    Returns:
+        (Dict): extraction result without the text, see extract_pdf()
+    """
+    if isinstance(pdfFile, bytes):
+        pdfContent = pdfFile
+    else:
+        with open(pdfFile, 'rb') as pdf:
+            pdfContent = pdf.read()
+    contentHash = sha256(pdfContent).hexdigest()
+    cacheFile = os.path.join(cacheDirectory, contentHash + '.json')
+    if os.path.isfile(cacheFile):
+        with open(cacheFile, 'r') as cache:
+            extraction = json.load(cache)
+    else:
+        extraction = extract_pdf(pdfContent)
+        extraction['Hash'] = contentHash
+        # Write then rename, so other workers never read a half written cache file
+        with open(cacheFile + '.tmp', 'w') as cache:
+            json.dump(extraction, cache)
+        os.replace(cacheFile + '.tmp', cacheFile)
+    return {field: extraction[field] for field in reportFields if field in extraction}
+
+class PdfExtractor:
+    """
+    Queues pdfs for extraction in a process pool as they are downloaded, and attaches the results to the company records at the end of the run.
+    If pdfplumber is not installed, extraction is skipped.
+
+    Files Chrome is still downloading are held back in this process until they are complete, so a pdf which never arrives
+    (a missing tearsheet, an error page) does not hold up a worker process.
+    """
+    def __init__(self, cacheDirectory=pdfCacheDirectory, workers=PDF_WORKERS, timeout=downloadTimeout):
+        self.cacheDirectory = cacheDirectory
+        self.timeout = timeout
+        self.futures = {}
+        # (stock, report, pdfFile, deadline) of files which are still downloading
+        self.downloading = []
+        self.executor = None
+        if pdfplumber is None:
+            logger.warning("pdfplumber is not installed, pdfs will not be extracted")
+            return
+        os.makedirs(cacheDirectory, exist_ok=True)
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+
+    def submit(self, stock, report, pdfFile):
+        """
+        Queues a pdf for extraction, the download does not need to have finished
+
+        Args:
+            stock (String): The stock ticker the pdf belongs to
+            report (String): name the result is stored under, e.g. 'Tearsheet' or 'AnnualReport'
+            pdfFile (String or Bytes): Location where the file is being downloaded to, or the content of a captured file
+        """
+        if self.executor is None:
+            return
+        if isinstance(pdfFile, bytes):
+            self.start(stock, report, pdfFile)
+        else:
+            self.downloading.append((stock, report, pdfFile, time() + self.timeout))
+        self.check_downloads()
+
+    def start(self, stock, report, pdfFile):
+        """
+        Hands a complete pdf to the process pool
+        """
+        logger.info("Queued {} {} for extraction".format(stock, report))
+        self.futures.setdefault(stock, {})[report] = self.executor.submit(extract_pdf_cached, pdfFile, self.cacheDirectory)
+
+    def check_downloads(self, wait=False):
+        """
+        Starts the extraction of every finished download, and gives up on downloads past their deadline
+
+        Args:
+            wait (Boolean): [Optional] wait until every download has finished or passed its deadline
+        """
+        downloading = []
+        for stock, report, pdfFile, deadline in self.downloading:
+            if is_downloaded(pdfFile) or (wait and wait_for_download(pdfFile, max(0, deadline - time()))):
+                self.start(stock, report, pdfFile)
+            elif time() >= deadline or wait:
+                logger.warning("{} {} was not downloaded".format(stock, report))
+                self.futures.setdefault(stock, {})[report] = None
+            else:
+                downloading.append((stock, report, pdfFile, deadline))
+        self.downloading = downloading
+
+    def collect(self, stockDataArray):
+        """
+        Waits for all queued extractions and stores them in each company's 'Reports' section
+
+        Args:
+            stockDataArray (List): dictionary of all company information
+        """
+        self.check_downloads(wait=True)
+        for stock in stockDataArray:
+            reports = {}
+            for report, future in self.futures.get(stock['Summary']['Ticker'], {}).items():
+                if future is None:
+                    reports[report] = {'Error': 'File was not downloaded'}
+                    continue
+                try:
+                    reports[report] = future.result()
+                except Exception as error:
+                    logger.warning("Extraction of {} {} failed: {}".format(stock['Summary']['Ticker'], report, error))
+                    reports[report] = {'Error': str(error)}
+            if reports:
+                stock['Reports'] = reports
+        logger.info("Pdf extraction complete")
+
+    def shutdown(self):
+        """
+        Stops the worker processes, cancelling anything which has not started yet
+        """
+        if self.executor is not None:
+            for reports in self.futures.values():
+                for future in reports.values():
+                    if future is not None:
+                        future.cancel()
+            self.executor.shutdown(wait=False)
@@ -0,0 +1,66 @@
+"""
+Lists the companies of every market in the background, so scraping can start on the first company while the rest of the listing is still loading.
+"""
+from nzxscraper.environment import COMPANIES
+from nzxscraper.scrape_data import get_browser, login, iterate_companies
+from nzxscraper import logger
+from threading import Thread
+from queue import Queue
+
+class ListingStream:
+    """
+    Runs iterate_companies() on its own browser in a background thread, handing each company over as it is found.
+
+    Attributes:
+        tickers (List): every ticker handed over so far, in listing order
+        complete (Boolean): True once every market has been listed
+    """
+    def __init__(self, limit=COMPANIES):
+        """
+        Args:
+            limit (Int): [Optional] stop after this many companies, every company is listed if None
+        """
+        self.limit = limit
+        self.tickers = []
+        self.complete = False
+        self.listings = Queue()
+        # A daemon thread, so a listing which hangs can not keep the process alive
+        self.producer = Thread(target=self.produce, name='listing', daemon=True)
+        self.producer.start()
+
+    def produce(self):
+        """
+        Puts every company on the queue, followed by None once the listing ends, or the error which ended it
+        """
+        browser = None
+        try:
+            browser = get_browser()
+            login(browser)
+            for listing in iterate_companies(browser, self.limit):
+                self.listings.put(listing)
+            self.listings.put(None)
+        except Exception as error:
+            logger.error("Listing companies failed: {!r}".format(error))
+            self.listings.put(error)
+        finally:
+            if browser:
+                browser.quit()
+
+    def __iter__(self):
+        """
+        Yields:
+            (Tuple): (ticker, market cap, link to the company summary page), as soon as each is found
+
+        Raises:
+            Exception: whatever stopped the listing, once the companies found before it have been yielded
+        """
+        while True:
+            listing = self.listings.get()
+            if listing is None:
+                self.complete = True
+                logger.info("{} companies listed".format(len(self.tickers)))
+                return
+            if isinstance(listing, Exception):
+                raise listing
+            self.tickers.append(listing[0])
+            yield listing
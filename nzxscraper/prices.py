@@ -0,0 +1,131 @@
+"""
+Compact, array backed containers for the historical data of a company.
+"""
+import numpy
+
+class PriceSeries:
+    """
+    Historical prices of a single company, stored as one NumPy array per column rather than one dictionary per trading day.
+
+    Attributes:
+        dates (numpy.ndarray): datetime64[D] trading dates
+        last (numpy.ndarray): float64 closing prices
+        volume (numpy.ndarray): float64 volumes traded
+        dollarValueTraded (numpy.ndarray): float64 dollar value traded
+    """
+    __slots__ = ('dates', 'last', 'volume', 'dollarValueTraded')
+
+    def __init__(self, dates, last, volume, dollarValueTraded):
+        self.dates = numpy.asarray(dates, dtype='datetime64[D]')
+        self.last = numpy.asarray(last, dtype=numpy.float64)
+        self.volume = numpy.asarray(volume, dtype=numpy.float64)
+        self.dollarValueTraded = numpy.asarray(dollarValueTraded, dtype=numpy.float64)
+
+    @classmethod
+    def from_dataframe(cls, pricesDF):
+        """
+        Creates the series from the DataFrame of a historical prices csv
+
+        Args:
+            pricesDF (DataFrame): must contain a datetime 'Date' column and 'Last', 'Volume', '$ Value Traded' columns
+
+        Returns:
+            (PriceSeries): the price series, sorted oldest first
+        """
+        pricesDF = pricesDF.sort_values('Date')
+        return cls(pricesDF['Date'].values.astype('datetime64[D]'),
+                   pricesDF['Last'].values,
+                   pricesDF['Volume'].values,
+                   pricesDF['$ Value Traded'].values)
+
+    @classmethod
+    def from_dict(cls, pricesDict):
+        """
+        Creates the series from the dictionary made by to_dict(), e.g. a result sent back by a distributed worker
+
+        Args:
+            pricesDict (Dict): {'YYYY-MM-DD': {'Last': Float, 'Volume': Float, 'Dollar Value Traded': Float}}
+
+        Returns:
+            (PriceSeries): the price series, sorted oldest first
+        """
+        dates = sorted(pricesDict)
+        return cls(dates,
+                   [pricesDict[date]['Last'] for date in dates],
+                   [pricesDict[date]['Volume'] for date in dates],
+                   [pricesDict[date]['Dollar Value Traded'] for date in dates])
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __str__(self):
+        return "PriceSeries({} days, {} to {})".format(len(self), self.dates[0] if len(self) else None, self.dates[-1] if len(self) else None)
+
+    def to_dict(self):
+        """
+        Converts the series to the dictionary sent to the server, only to be used at the output boundary
+
+        Returns:
+            (Dict): {'YYYY-MM-DD': {'Last': Float, 'Volume': Float, 'Dollar Value Traded': Float}}
+        """
+        dateStrings = numpy.datetime_as_string(self.dates, unit='D').tolist()
+        return {date: {'Last': last, 'Volume': volume, 'Dollar Value Traded': dollarValueTraded}
+                for date, last, volume, dollarValueTraded
+                in zip(dateStrings, self.last.tolist(), self.volume.tolist(), self.dollarValueTraded.tolist())}
+
+class DividendSeries:
+    """
+    Historical dividends of a single company, stored as NumPy arrays.
+
+    Attributes:
+        dates (numpy.ndarray): datetime64[D] ex dividend dates
+        amounts (numpy.ndarray): float64 gross dividend amounts
+    """
+    __slots__ = ('dates', 'amounts')
+
+    def __init__(self, dates, amounts):
+        self.dates = numpy.asarray(dates, dtype='datetime64[D]')
+        self.amounts = numpy.asarray(amounts, dtype=numpy.float64)
+
+    @classmethod
+    def from_dataframe(cls, dividendDF):
+        """
+        Creates the series from a DataFrame with a datetime 'Date' column and a float 'Dividend Paid' column
+
+        Args:
+            dividendDF (DataFrame): dividends read from the historical dividends csv
+
+        Returns:
+            (DividendSeries): the dividend series, sorted oldest first
+        """
+        dividendDF = dividendDF.sort_values('Date')
+        return cls(dividendDF['Date'].values.astype('datetime64[D]'), dividendDF['Dividend Paid'].values)
+
+    @classmethod
+    def from_dict(cls, dividendsDict):
+        """
+        Creates the series from the dictionary made by to_dict()
+
+        Args:
+            dividendsDict (Dict): {'YYYY-MM-DD': Float}
+
+        Returns:
+            (DividendSeries): the dividend series, sorted oldest first
+        """
+        dates = sorted(dividendsDict)
+        return cls(dates, [dividendsDict[date] for date in dates])
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __str__(self):
+        return "DividendSeries({} dividends)".format(len(self))
+
+    def to_dict(self):
+        """
+        Converts the series to the dictionary sent to the server, only to be used at the output boundary
+
+        Returns:
+            (Dict): {'YYYY-MM-DD': Float}
+        """
+        return dict(zip(numpy.datetime_as_string(self.dates, unit='D').tolist(), self.amounts.tolist()))
@@ -0,0 +1,173 @@
+"""
+Functions related to locating the annual reports of a company without loading them in the browser.
+"""
+from nzxscraper.environment import annualReportCacheFile
+from nzxscraper import logger
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from threading import Lock
+import requests
+import json
+import os
+
+# Most NZX companies balance in June or December, so new annual reports are released in these months
+reportingSeasonMonths = (2, 8)
+# Reports keep being released for a few months after the season starts, so missing reports are checked again weekly during that time
+reportingSeasonLength = 3 # months
+recheckDays = 7
+# Number of years, counting back from the current year, to look for an annual report
+candidateYears = 2
+headTimeout = 10 # seconds
+
+def create_annual_report_link(stock, year):
+    """
+    Creates a url to retrieve the annual report based on the current stock and year
+
+    Args:
+        year (String): the annual report release year
+        stock (String): The stock ticker currently being scraped
+
+    Returns:
+        annualReportLink (String): url at which the annual report file is stored
+    """
+
+# 'https://companyresearch-nzx-com.ezproxy.aut.ac.nz/reports/nz/'2019/ANZ2019.pdf
+    annualReportLink = 'https://companyresearch-nzx-com.ezproxy.aut.ac.nz/reports/nz/'
+    annualReportLink += year + "/"
+    annualReportLink += stock + year + ".pdf"
+
+    return annualReportLink
+
+def get_browser_session(browser):
+    """
+    Creates a requests session which shares the login cookies of the browser, so files can be checked without the browser
+
+    Args:
+        browser (Selenium.WebDriver): The automated Chrome browser, already logged in
+
+    Returns:
+        session (requests.Session): session authenticated as the browser
+    """
+    session = requests.Session()
+    session.headers['User-Agent'] = browser.execute_script("return navigator.userAgent")
+    for cookie in browser.get_cookies():
+        session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain'), path=cookie.get('path', '/'))
+    return session
+
+def next_reporting_season(fromDate):
+    """
+    Finds the first day of the next reporting season after the given date
+
+    Args:
+        fromDate (date): the date to start from
+
+    Returns:
+        (date): the first day of the next reporting season
+    """
+    for month in reportingSeasonMonths:
+        if fromDate.month < month:
+            return date(fromDate.year, month, 1)
+    return date(fromDate.year + 1, reportingSeasonMonths[0], 1)
+
+def in_reporting_season(fromDate):
+    """
+    Checks whether new annual reports are still being released on the given date
+
+    Args:
+        fromDate (date): the date to check
+
+    Returns:
+        (Boolean): True if the date falls within reportingSeasonLength months of the start of a reporting season
+    """
+    return any(0 <= (fromDate.month - month) % 12 < reportingSeasonLength for month in reportingSeasonMonths)
+
+class AnnualReportResolver:
+    """
+    Finds the most recent annual report of a company using HEAD requests for every candidate year in parallel.
+    A report from the current year is cached until the next reporting season, as no newer report can appear before then.
+    An older report, or no report, is checked again weekly during a reporting season, as this year's report may still be released.
+    """
+    def __init__(self, cacheFile=annualReportCacheFile):
+        self.cacheFile = cacheFile
+        self.cache = {}
+        # An abandoned scrape may still be resolving while the scrape which replaced it does the same
+        self.lock = Lock()
+        if os.path.isfile(cacheFile):
+            try:
+                with open(cacheFile, 'r') as cache:
+                    self.cache = json.load(cache)
+            except ValueError:
+                logger.warning("Annual report cache is unreadable, starting a new one")
+
+    def save(self):
+        """
+        Writes the cache to disk so the next run can reuse it
+        """
+        with open(self.cacheFile, 'w') as cache:
+            json.dump(self.cache, cache, indent=4)
+
+    def resolve(self, browser, stock):
+        """
+        Finds the link to the latest annual report of a company.
+        The browser cookies are only copied into a requests session when the answer is not cached
+
+        Args:
+            browser (Selenium.WebDriver): The automated Chrome browser, already logged in
+            stock (String): The stock ticker currently being scraped
+
+        Returns:
+            (String): link to the latest annual report, None if there is none available
+        """
+        today = date.today()
+        cached = self.cache.get(stock)
+        if cached and cached['Expires'] > today.isoformat():
+            logger.info("Annual report for {} found in cache".format(stock))
+            return cached['Link']
+
+        session = get_browser_session(browser)
+        year = today.year
+        candidateLinks = [create_annual_report_link(stock, str(year - offset)) for offset in range(candidateYears)]
+        with ThreadPoolExecutor(max_workers=candidateYears) as executor:
+            available = list(executor.map(lambda link: self.is_available(session, link), candidateLinks))
+
+        # Candidates are ordered newest first
+        annualReportLink = next((link for link, found in zip(candidateLinks, available) if found), None)
+        if annualReportLink is None:
+            logger.warning("No annual report found for " + stock)
+        # A failed request says nothing about the report, so the answer is not cached
+        if None in available:
+            return annualReportLink
+        if annualReportLink == candidateLinks[0] or not in_reporting_season(today):
+            expires = next_reporting_season(today)
+        else:
+            expires = min(today + timedelta(days=recheckDays), next_reporting_season(today))
+        with self.lock:
+            self.cache[stock] = {'Link': annualReportLink, 'Expires': expires.isoformat()}
+            self.save()
+        return annualReportLink
+
+    @staticmethod
+    def is_available(session, link):
+        """
+        Checks whether a file exists without downloading it
+
+        Args:
+            session (requests.Session): session created by get_browser_session()
+            link (String): url of the file
+
+        Returns:
+            (Boolean): True if the server has the file, None if the request failed or was sent to another page, e.g. the login page
+        """
+        try:
+            r = session.head(link, allow_redirects=True, timeout=headTimeout)
+        except requests.RequestException as error:
+            logger.warning("HEAD request to {} failed: {}".format(link, error))
+            return None
+        contentType = r.headers.get('Content-Type', '')
+        logger.debug("HEAD %s returned %s %s from %s", link, r.status_code, contentType, r.url)
+        if r.status_code == 200 and contentType.startswith('application/pdf'):
+            return True
+        if r.url != link:
+            logger.warning("HEAD request to {} ended at {}, the session may have expired".format(link, r.url))
+            return None
+        return False
@@ -1,10 +1,14 @@
 """
     Contains all functions required to send data externally.
 """
-from nzxscraper.environment import DEBUG, tempDirectory
+from nzxscraper.environment import DEBUG, tempDirectory, FULL_SNAPSHOT
 from nzxscraper import logger, printProgressBar
+from nzxscraper.delta import build_delta, load_snapshot_hashes, save_snapshot_hashes
+from nzxscraper.store import ingest_snapshot
+from nzxscraper.capture import capturedFiles
 from datetime import datetime
 import requests
+import sqlite3
 import json
 import platform
 from xml.etree import ElementTree
@@ -22,13 +26,22 @@ def getDestinationURL():
     localTestURL = 'http://localhost:8000/update'
     return localTestURL if platform.system() == 'Windows' else linodeURL
 
-def save_data(stockDataArray, success):
+def save_data(stockDataArray, success, fullSnapshot=False, universe=None, scoreUpdates=None):
     """
     Constructs a dictionary of company information. Converts it JSON, and sends it externally using send_to_server()
 
+    Unless a full snapshot is requested (or the FULL_SNAPSHOT environment variable is set),
+    only the records which changed since the last successful upload are sent, see build_delta()
+
     Args:
         stockDataArray (List): dictionary of all company information
         success (Boolean): To indicate whether the scraping was succesful, to identify if processing needs to occur
+        fullSnapshot (Boolean): [Optional] send every record regardless of the previous snapshot
+        universe (List): [Optional] every listed ticker, including companies which had nothing due this run
+        scoreUpdates (Dict): [Optional] ticker to the new Summary score fields of companies which were rescored without being scraped
+
+    Returns:
+        (Boolean): True if the server accepted the scraped data
     """
     currentTimeStamp = datetime.now().strftime('%Y/%m/%d')
     scrapeInsert = {currentTimeStamp:{'Date':currentTimeStamp}}
@@ -43,30 +56,18 @@ def save_data(stockDataArray, success):
         # Select stock
         for stock in stockDataArray:
             currentStockTicker = stock['Summary']['Ticker']
-            logger.info("Saving data for: " + currentStockTicker)
+            logger.info("Saving data for: %s", currentStockTicker)
             stockInsert = {}
 
             # Create stock dict from scraped data
             for sectionKey, sectionData in stock.items():
-                logger.info(sectionKey)
+                logger.debug("Saving %s", sectionKey)
                 sectionInsert = {}
                 if sectionKey == 'HistoricalPrices':
-                    for line in sectionData:
-                        logger.debug(line)
-                        dateString = line.pop('Date')
-                        dateString = (datetime.strptime(dateString, '%d %b %Y')).strftime("%Y-%m-%d")
-                        sectionInsert[dateString] = line
-                    stockInsert[sectionKey] = sectionInsert
+                    stockInsert[sectionKey] = sectionData.to_dict()
                 elif sectionKey == 'HistoricalDividends':
-                    try:
-                        for line in sectionData:
-                            logger.debug(line)
-                            dateString = line.pop('Date')
-                            dateString = (datetime.strptime(dateString, '%d %b %Y')).strftime("%Y-%m-%d")
-                            sectionInsert[dateString] = line.pop('Dividend Paid')
-                        stockInsert[sectionKey] = sectionInsert
-                    except TypeError:
-                        pass
+                    # An empty section lets the delta report dividends which are no longer listed
+                    stockInsert[sectionKey] = sectionData.to_dict() if sectionData is not None else {}
                 else:
                     for elementKey, elementValue in sectionData.items():
                         sectionInsert[elementKey] = elementValue
@@ -76,16 +77,36 @@ def save_data(stockDataArray, success):
             stockIteration += 1
             printProgressBar(stockIteration, len(stockDataArray), prefix='Saving {} data'.format(stock['Summary']['Ticker']), suffix = 'of {} companies completed'.format(len(stockDataArray)))
 
+        # Only the score fields of these Summary sections are sent, the rest of the Summary is unchanged
+        scoreUpdates = scoreUpdates or {}
+        for ticker, summaryFields in scoreUpdates.items():
+            scrapeInsert[currentTimeStamp][ticker] = {'Summary': dict(summaryFields)}
+
         with open('data.txt', 'w') as outfile:
             json.dump(scrapeInsert, outfile, indent=4)
 
         # save_result_to_pastebin(scrapeInsert, currentTimeStamp)
-        send_to_server(scrapeInsert)
+        previousHashes = None if (fullSnapshot or FULL_SNAPSHOT) else load_snapshot_hashes()
+        deltaInsert, snapshotHashes = build_delta(scrapeInsert, currentTimeStamp, previousHashes, universe,
+                                                  partial={ticker: ('Summary',) for ticker in scoreUpdates})
+        r = send_to_server(deltaInsert)
+        # Only move the base of the next delta forward once the server has accepted this one
+        if r.ok:
+            save_snapshot_hashes(snapshotHashes)
+        else:
+            logger.warning("Server rejected the snapshot, the next run will be compared against the previous one")
+        # The local history is secondary to the upload, so it is written afterwards and a failure only loses this run's history
+        try:
+            ingest_snapshot(scrapeInsert, currentTimeStamp)
+        except sqlite3.Error as error:
+            logger.error("Storing the snapshot in the local history failed: {!r}".format(error))
         send_files_to_server()
+        return r.ok
     else:
         scrapeInsert[currentTimeStamp] = {}
         # save_result_to_pastebin(scrapeInsert, currentTimeStamp)
         send_to_server(scrapeInsert)
+        return False
 
 def send_to_server(scrapeInsert):
     """
@@ -93,12 +114,16 @@ def send_to_server(scrapeInsert):
 
     Args:
         scrapeInsert (JSON): JSON object with all company information
+
+    Returns:
+        r (Response): the response from the server
     """
     destinationURL = getDestinationURL()
     headers = {'Content-type': 'application/json', 'Accept': 'text/plain'}
     r = requests.post(destinationURL, data=json.dumps(scrapeInsert), headers=headers)
     logger.info("Sent JSON data to {}".format(destinationURL))
     logger.info("Received response {}".format(r.status_code))
+    return r
 
 def save_log_to_pastebin():
     """
@@ -158,21 +183,27 @@ def save_log_to_pastebin():
 
 def send_files_to_server():
     """
-    This method is used to retrieve all pdf files from the temp folder and send them to the appropriate URL
+    This method is used to retrieve all pdf files and send them to the appropriate URL
+    Files captured in memory (see DownloadCapture) are sent from capturedFiles, otherwise they are read from the temp folder
     """
-    fileList = os.listdir("temp")
+    if capturedFiles:
+        fileList = list(capturedFiles.items())
+    elif os.path.isdir("temp"):
+        fileList = [(file, os.path.join(r'temp', file)) for file in os.listdir("temp") if file.endswith(".pdf")]
+    else:
+        logger.info("No files to send")
+        return
     fileIteration = 0
-    pdfIteration = 0
     destinationURL = getDestinationURL()
     logger.info("Sending files to: " + destinationURL)
 
-    for file in fileList:
+    for file, source in fileList:
         fileIteration += 1
-        fileJSON = {}
-        if file.endswith(".pdf"):
-            pdfIteration += 1
-            with open(os.path.join(r'temp', file), 'rb') as fileContent:
-                fileJSON[file] = fileContent
-                r = requests.post(destinationURL, files=fileJSON)
-            logger.info("Sent file: " + file)
-            printProgressBar(fileIteration, len(fileList), prefix='Saving {} data'.format(file).ljust(24), suffix = '| {} files completed'.format(pdfIteration), length = 10)
\ No newline at end of file
+        if isinstance(source, bytes):
+            r = requests.post(destinationURL, files={file: source})
+        else:
+            with open(source, 'rb') as fileContent:
+                r = requests.post(destinationURL, files={file: fileContent})
+        logger.info("Sent file: " + file)
+        printProgressBar(fileIteration, len(fileList), prefix='Saving {} data'.format(file).ljust(24), suffix = '| {} files completed'.format(fileIteration), length = 10)
+    capturedFiles.clear()
@@ -0,0 +1,168 @@
+"""
+Decides which sections of which companies need to be scraped in a run, so slow changing data is not fetched every day.
+"""
+from nzxscraper.environment import scheduleFile, TOP_TIER, FULL_REFRESH
+from nzxscraper.reports import next_reporting_season
+from nzxscraper.delta import hash_record
+from nzxscraper.prices import PriceSeries, DividendSeries
+from nzxscraper import logger
+from datetime import date
+from bisect import bisect_right, insort
+import json
+import os
+
+# Starting refresh interval of each section in days, for companies in the top tier
+sectionIntervals = {
+                    'Summary': 1,
+                    'Ratio': 1,
+                    'HistoricalPrices': 1,
+                    'HistoricalDividends': 7,
+                    'Tearsheet': 7,
+                    'Directors': 30,
+                    'Profile': 30,
+                    'AnnualReport': 90,
+                    'FinancialProfile': 90,
+                   }
+# Sections which always become due once a reporting season starts
+reportingSections = ('AnnualReport', 'FinancialProfile')
+# Shortest interval of companies outside the top tier
+longTailInterval = 7
+# Intervals shrink when a section changed since the last fetch, and grow when it did not
+changedFactor = 0.5
+unchangedFactor = 1.5
+maxIntervalFactor = 8
+
+class MarketCapRanking:
+    """
+    Ranks companies by market cap while they are still being listed, so a company can be scheduled as soon as it is found.
+
+    The rank of a company is the number of companies listed before it with a larger market cap. The main board is listed first,
+    sorted by market cap, so its companies get their true rank. A company on a later market is only ranked against the companies
+    listed before it, which can only place it higher than its true rank, never lower.
+    """
+    def __init__(self):
+        # Market caps of the companies ranked so far, smallest first
+        self.marketCaps = []
+
+    def rank(self, marketCap):
+        """
+        Ranks the next listed company
+
+        Args:
+            marketCap (Float): market cap of the company, None if it could not be read
+
+        Returns:
+            (Int): 0 for the largest company so far. Companies without a market cap are ranked after every company listed before them
+        """
+        if marketCap is None:
+            return len(self.marketCaps)
+        rank = len(self.marketCaps) - bisect_right(self.marketCaps, marketCap)
+        insort(self.marketCaps, marketCap)
+        return rank
+
+class RefreshScheduler:
+    """
+    Keeps, for every (ticker, section) pair, when it was last fetched, its hash and its current refresh interval.
+    """
+    def __init__(self, stateFile=scheduleFile):
+        self.stateFile = stateFile
+        self.schedule = {}
+        if os.path.isfile(stateFile):
+            with open(stateFile, 'r') as state:
+                self.schedule = json.load(state)
+
+    def save(self):
+        """
+        Writes the schedule to disk for the next run
+        """
+        with open(self.stateFile, 'w') as state:
+            json.dump(self.schedule, state, indent=4)
+
+    @staticmethod
+    def interval_limits(section, rank):
+        """
+        Finds the starting and longest interval of a section for a company at a given market cap rank
+
+        Returns:
+            (Tuple): (shortest interval, longest interval) in days
+        """
+        baseInterval = sectionIntervals[section]
+        if rank >= TOP_TIER:
+            baseInterval = max(baseInterval, longTailInterval)
+        return baseInterval, sectionIntervals[section] * maxIntervalFactor
+
+    def due_sections(self, stock, rank, today=None):
+        """
+        Finds the sections of a company which are due to be fetched
+
+        Args:
+            stock (String): The stock ticker
+            rank (Int): market cap rank of the company, see MarketCapRanking
+            today (date): [Optional] the date of the run
+
+        Returns:
+            dueSections (Set): names of the sections to fetch, empty if the company can be skipped
+        """
+        today = today or date.today()
+        if FULL_REFRESH:
+            return set(sectionIntervals)
+        tickerSchedule = self.schedule.get(stock, {})
+        dueSections = set()
+        for section in sectionIntervals:
+            entry = tickerSchedule.get(section)
+            if entry is None:
+                dueSections.add(section)
+                continue
+            lastFetched = date.fromisoformat(entry['Fetched'])
+            shortest, longest = self.interval_limits(section, rank)
+            interval = min(max(entry['Interval'], shortest), longest)
+            if (today - lastFetched).days >= interval:
+                dueSections.add(section)
+            elif section in reportingSections and next_reporting_season(lastFetched) <= today:
+                dueSections.add(section)
+        return dueSections
+
+    def record(self, stock, rank, stockData, fetchedSections, today=None):
+        """
+        Records the sections fetched for a company, and adapts their intervals depending on whether they changed
+
+        Args:
+            stock (String): The stock ticker
+            rank (Int): market cap rank of the company, see MarketCapRanking
+            stockData (Dict): the scraped company data
+            fetchedSections (Set): the sections which were fetched
+            today (date): [Optional] the date of the run
+        """
+        today = today or date.today()
+        tickerSchedule = self.schedule.setdefault(stock, {})
+        for section in fetchedSections:
+            shortest, longest = self.interval_limits(section, rank)
+            entry = tickerSchedule.get(section, {'Interval': shortest, 'Hash': None, 'Fetches': 0, 'Changes': 0})
+            entry['Fetched'] = today.isoformat()
+            entry['Fetches'] += 1
+            # Files are not parsed here, so their interval stays where it is
+            if section in stockData:
+                sectionData = stockData[section]
+                # Hashed in the form the section is uploaded in, so the hash matches the delta
+                if isinstance(sectionData, (PriceSeries, DividendSeries)):
+                    sectionData = sectionData.to_dict()
+                sectionHash = hash_record(sectionData)
+                if entry['Hash'] is not None:
+                    if sectionHash != entry['Hash']:
+                        entry['Changes'] += 1
+                        entry['Interval'] = entry['Interval'] * changedFactor
+                    else:
+                        entry['Interval'] = entry['Interval'] * unchangedFactor
+                entry['Hash'] = sectionHash
+            entry['Interval'] = min(max(entry['Interval'], shortest), longest)
+            tickerSchedule[section] = entry
+        logger.debug("%s schedule: %s", stock, tickerSchedule)
+
+    def retain(self, tickers):
+        """
+        Forgets every company which is not in the given list
+
+        Args:
+            tickers (List): tickers to keep
+        """
+        self.schedule = {ticker: entry for ticker, entry in self.schedule.items() if ticker in tickers}
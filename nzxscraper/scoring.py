@@ -0,0 +1,187 @@
+"""
+Scores each company based on its own values compared to the other companies, keeping the values of every company
+between runs so only the companies affected by a refresh are rescored.
+"""
+from nzxscraper.environment import scoringStateFile
+from nzxscraper import logger
+from bisect import bisect_left, insort
+import json
+import os
+
+# Metric name, and whether a lower value is better (the index is inverted)
+scoringMetrics = {
+                    'Dividend Yield': False,
+                    'Return on Equity': False,
+                    'Sharpe Ratio': False,
+                    'Debt Equity': True,
+                 }
+
+def find_metric_values(stock):
+    """
+    Finds the value of each scoring metric which can be calculated from the sections scraped for a company.
+    Return on Equity and Debt Equity are saved into the Ratio section.
+
+    Args:
+        stock (Dict): dictionary of company information
+
+    Returns:
+        values (Dict): metric name to value, only for the metrics which could be calculated
+    """
+    values = {}
+    if 'Ratio' in stock:
+        values['Dividend Yield'] = stock['Ratio']['Net Yield']
+        values['Sharpe Ratio'] = stock['Ratio']['Sharpe Ratio']
+    if 'FinancialProfile' in stock:
+        balance = stock['FinancialProfile']['Data']['Balance']
+        values['Return on Equity'] = (stock['FinancialProfile']['Data']['Income']['Net Income'] / balance['Total Equity']) * 100
+        values['Debt Equity'] = balance['Total Liabilities'] / balance['Total Equity']
+        if 'Ratio' in stock:
+            stock['Ratio']['Return on Equity'] = values['Return on Equity']
+            stock['Ratio']['Debt Equity'] = values['Debt Equity']
+    return values
+
+class ScoringEngine:
+    """
+    Keeps the value of every scoring metric for every company, sorted, so the normalisation ranges are read
+    from the ends of the sorted lists instead of scanning every company.
+
+    When companies are refreshed, only their values are replaced. The remaining companies are rescored
+    only if a normalisation range moved, which changes their normalised values.
+
+    Each metric is normalised to between 0 and 1 over a range which includes 0, with a buffer of 1 on either side
+    so no company receives a perfect or zero index. The score is the geometric average of the indexes.
+    """
+    def __init__(self, stateFile=scoringStateFile):
+        self.stateFile = stateFile
+        self.values = {metric: {} for metric in scoringMetrics}
+        self.indexes = {}
+        self.scores = {}
+        self.ranges = {}
+        if os.path.isfile(stateFile):
+            with open(stateFile, 'r') as state:
+                savedState = json.load(state)
+            self.values.update(savedState['Values'])
+            self.indexes = savedState['Indexes']
+            self.scores = savedState['Scores']
+            self.ranges = savedState['Ranges']
+        self.sortedValues = {metric: sorted(tickerValues.values()) for metric, tickerValues in self.values.items()}
+
+    def save(self):
+        """
+        Writes the values, indexes and scores to disk for the next run
+        """
+        with open(self.stateFile, 'w') as state:
+            json.dump({'Values': self.values, 'Indexes': self.indexes, 'Scores': self.scores, 'Ranges': self.ranges}, state)
+
+    def set_value(self, metric, ticker, value):
+        """
+        Replaces the value of a metric for a company, keeping the sorted list in order
+
+        Returns:
+            (Boolean): True if the value changed
+        """
+        previous = self.values[metric].get(ticker)
+        if previous == value:
+            return False
+        if previous is not None:
+            del self.sortedValues[metric][bisect_left(self.sortedValues[metric], previous)]
+        insort(self.sortedValues[metric], value)
+        self.values[metric][ticker] = value
+        return True
+
+    def retain(self, tickers):
+        """
+        Forgets every company which is not in the given list, e.g. companies which left the scraped universe
+
+        Args:
+            tickers (List): tickers to keep
+        """
+        tickers = set(tickers)
+        for metric, tickerValues in self.values.items():
+            for ticker in [ticker for ticker in tickerValues if ticker not in tickers]:
+                del self.sortedValues[metric][bisect_left(self.sortedValues[metric], tickerValues.pop(ticker))]
+        self.indexes = {ticker: index for ticker, index in self.indexes.items() if ticker in tickers}
+        self.scores = {ticker: score for ticker, score in self.scores.items() if ticker in tickers}
+
+    def find_range(self, metric):
+        """
+        Finds the max and min of a metric with a buffer of 1. The range always includes 0, so a metric whose values
+        are all positive is normalised from 0, and one whose values are all negative up to 0
+
+        Returns:
+            (List): [max, min]
+        """
+        highest = self.sortedValues[metric][-1]
+        lowest = self.sortedValues[metric][0]
+        return [highest + 1 if highest >= 0 else 0, lowest - 1 if lowest <= 0 else 0]
+
+    def summary_fields(self, ticker):
+        """
+        Returns:
+            (Dict): the indexes and score of a company, as stored in its Summary section
+        """
+        return {
+                    'Net Dividend Yield Index': self.indexes[ticker]['Dividend Yield'],
+                    'Return on Equity Index': self.indexes[ticker]['Return on Equity'],
+                    'Sharpe Ratio Index': self.indexes[ticker]['Sharpe Ratio'],
+                    'Debt Equity Index': self.indexes[ticker]['Debt Equity'],
+                    'Score': self.scores[ticker],
+               }
+
+    def update(self, stockDataArray):
+        """
+        Takes in the refreshed companies, rescores every company whose normalised values moved,
+        and stores the indexes and score in the Summary of each refreshed company.
+        Companies which were rescored without being refreshed need their new Summary fields sent too, see summary_fields().
+        The new state is only kept for the next run once save() is called.
+
+        Args:
+            stockDataArray (List): dictionary of the refreshed company information
+
+        Returns:
+            rescored (List): tickers which received a new score
+        """
+        changedTickers = set()
+        for stock in stockDataArray:
+            ticker = stock['Summary']['Ticker']
+            for metric, value in find_metric_values(stock).items():
+                if self.set_value(metric, ticker, value):
+                    changedTickers.add(ticker)
+
+        movedMetrics = []
+        for metric in scoringMetrics:
+            if not self.sortedValues[metric]:
+                continue
+            metricRange = self.find_range(metric)
+            if self.ranges.get(metric) != metricRange:
+                self.ranges[metric] = metricRange
+                movedMetrics.append(metric)
+        logger.info("Normalisation ranges moved for: {}".format(movedMetrics))
+
+        tickersToScore = set(self.scores) | changedTickers if movedMetrics else changedTickers
+        rescored = []
+        for ticker in tickersToScore:
+            if not all(ticker in self.values[metric] for metric in scoringMetrics):
+                logger.warning("{} is missing metrics, it can not be scored yet".format(ticker))
+                continue
+            tickerIndexes = {}
+            for metric, inverted in scoringMetrics.items():
+                metricMax, metricMin = self.ranges[metric]
+                index = (self.values[metric][ticker] - metricMin) / (metricMax - metricMin)
+                tickerIndexes[metric] = 1 - index if inverted else index
+            if tickerIndexes != self.indexes.get(ticker):
+                self.indexes[ticker] = tickerIndexes
+                product = 1
+                for index in tickerIndexes.values():
+                    product *= index
+                # Geometric average to make score more accurate
+                self.scores[ticker] = product ** (1 / len(tickerIndexes))
+                rescored.append(ticker)
+        logger.info("Rescored {} companies".format(len(rescored)))
+
+        for stock in stockDataArray:
+            ticker = stock['Summary']['Ticker']
+            if ticker in self.scores:
+                stock['Summary'].update(self.summary_fields(ticker))
+                print("{} got a score of: {}".format(ticker, self.scores[ticker]))
+        return rescored
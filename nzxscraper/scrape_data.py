@@ -13,11 +13,33 @@ from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.chrome.options import Options
 from nzxscraper.environment import *
 from nzxscraper.classes import Stock
-from bs4 import BeautifulSoup
+from nzxscraper.prices import PriceSeries, DividendSeries
+from nzxscraper.reports import AnnualReportResolver, create_annual_report_link
+from nzxscraper.capture import DownloadCapture
+from nzxscraper.cache import ParseCache, parser_version
+from bs4 import BeautifulSoup, SoupStrainer
 from time import sleep
 from nzxscraper import logger, printProgressBar
 import unicodedata
 import warnings
+import os
+import re
+from io import BytesIO
+from urllib.parse import urljoin
+
+annualReportResolver = AnnualReportResolver()
+# Parsed pages of every company, reused when the page has not changed
+parseCache = ParseCache()
+
+# Only the table rows of a listing page are parsed, the rest of the page is skipped
+listingStrainer = SoupStrainer('tr')
+marketCapHeading = re.compile(r'market\s*cap', re.IGNORECASE)
+# The "next" link of the pager under a listing, matched on its whole text so company names containing "next" are not picked up
+nextPageLink = (".//*[contains(@class, 'pag')]//a[not(contains(@class, 'text'))]"
+                "[normalize-space(text())='Next' or normalize-space(text())='next' or normalize-space(text())='>' or normalize-space(text())='»']")
+
+# Every section scrape_company() can fetch
+allSections = ('Summary', 'Ratio', 'HistoricalPrices', 'HistoricalDividends', 'AnnualReport', 'Tearsheet', 'Directors', 'Profile', 'FinancialProfile')
 
 def get_browser() :
     """
@@ -45,10 +67,16 @@ def get_browser() :
             "download.prompt_for_download": False, # Auto downloads files into default directory
             "profile.managed_default_content_settings.images":2 } # Removes images for faster load times
     chromeOptions.add_experimental_option("prefs",prefs)
-    browser = webdriver.Chrome(chromeDriverLocation, chrome_options = chromeOptions) # Apply options
+    capabilities = chromeOptions.to_capabilities()
+    if DOWNLOAD_CAPTURE:
+        # The performance log carries the network events DownloadCapture reads request ids from
+        capabilities['goog:loggingPrefs'] = {'performance': 'ALL'}
+    browser = webdriver.Chrome(chromeDriverLocation, desired_capabilities = capabilities) # Apply options
     browser.command_executor._commands["send_command"] = ("POST", '/session/$sessionId/chromium/send_command')
     params = {'cmd': 'Page.setDownloadBehavior', 'params': {'behavior': 'allow', 'downloadPath': downloadDirectory}}
     browser.execute("send_command", params)
+    # A page which never finishes loading raises instead of blocking forever
+    browser.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
     homeURL = "https://library.aut.ac.nz/databases/nzx-deep-archive"
 
     browser.get(homeURL)
@@ -64,6 +92,38 @@ def get_browser() :
     print("Chromium open")
     return browser
 
+def click_when_ready(browser, by, value):
+    """
+    Waits for an element to become clickable, then clicks it
+
+    Args:
+        browser (Selenium.WebDriver): The automated Chrome browser
+        by (By): how to locate the element, e.g. By.XPATH
+        value (String): the locator
+
+    Raises:
+        TimeoutException: if the element is not clickable within ELEMENT_WAIT seconds
+    """
+    WebDriverWait(browser, ELEMENT_WAIT).until(EC.element_to_be_clickable((by, value))).click()
+
+def wait_for_elements(browser, by, value, count=1):
+    """
+    Waits until the page has at least count elements matching a locator, for elements which are picked by position
+
+    Args:
+        browser (Selenium.WebDriver): The automated Chrome browser
+        by (By): how to locate the elements, e.g. By.XPATH
+        value (String): the locator
+        count (Int): [Optional] number of elements needed
+
+    Returns:
+        (List): the matching elements
+
+    Raises:
+        TimeoutException: if there are not enough elements within ELEMENT_WAIT seconds
+    """
+    return WebDriverWait(browser, ELEMENT_WAIT).until(lambda driver: len(driver.find_elements(by, value)) >= count and driver.find_elements(by, value))
+
 def get_stock_summary(stockSoup) :
     """
     Gets the stock summary information from the company summary page including Name, Price<br>, Market Cap, Price Earnings Ratio, Price Change, Ticker, Earnings per Share, Net Tangible Assets, Net DPS, Gross DPS, Beta Value, Price/NTA, Net Yield, Gross Yield, Sharpe Ratio
@@ -86,7 +146,7 @@ def get_stock_summary(stockSoup) :
     summaryDict["Ticker"] = stockSoup.find('td', text= 'Ticker').find_next_sibling('td').text
 
 
-    logger.debug(summaryDict)
+    logger.debug("%s", summaryDict)
     return summaryDict
 
 def create_historical_prices_csv_link(stockTicker) :
@@ -120,25 +180,109 @@ def create_historical_dividends_csv_link(stockTicker) :
     logger.info("Pulling historical dividend data from: " + csvLink)
     return csvLink
 
-def get_stock_historical_prices(stockHistoricalPricesCSV) :
+# Columns and types read from the historical csv files, anything else in the files is skipped by the parser
+priceColumns = {'Date': str, 'Last': 'float64', 'Volume': 'float64', '$ Value Traded': 'float64'}
+dividendColumns = {'Ex Date': str, 'Gross Amount': str}
+csvDateFormat = '%d %b %Y'
+
+csvEngine = CSV_ENGINE
+if csvEngine == 'pyarrow':
+    # Older pandas versions and installs without pyarrow can not use the pyarrow engine, a tiny read finds out up front
+    try:
+        pandas.read_csv(BytesIO(b'a\n1'), engine='pyarrow')
+    except (ImportError, ValueError) as error:
+        logger.warning("The pyarrow csv engine is not available ({}), falling back to the c csv engine".format(error))
+        csvEngine = 'c'
+
+class MissingColumnsError(ValueError):
+    """
+    Raised when a csv does not have the columns it is read for
     """
-    Reads in the csv and outputs a dictionary for storage in the Stock class
+
+def read_csv_header(csvFile):
+    """
+    Reads only the header row of a csv
 
     Args:
-        stockHistoricalPricesCSV (String): Location where file is located
+        csvFile (String or BytesIO): Location where file is located, or its content. File objects are rewound afterwards
 
     Returns:
-        (Dict): dictionary of historical prices
+        (List): column names
+
+    Raises:
+        EmptyDataError: if the csv is empty
     """
+    header = pandas.read_csv(csvFile, nrows=0).columns.tolist()
+    if hasattr(csvFile, 'seek'):
+        csvFile.seek(0)
+    return header
+
+def read_typed_csv(csvFile, columns, dateColumn):
+    """
+    Reads only the given columns of a csv with their types set up front, and parses the date column
+    in one vectorised call using an explicit format. Numbers may use ',' as a thousands separator
+
+    Args:
+        csvFile (String or BytesIO): Location where file is located, or its content
+        columns (Dict): column name to dtype for every column which should be read
+        dateColumn (String): name of the column holding '%d %b %Y' dates
+
+    Returns:
+        (DataFrame): typed csv contents, with dateColumn as datetime64. Rows with unreadable dates are dropped and logged
+
+    Raises:
+        MissingColumnsError: if the csv does not have every column
+    """
+    header = read_csv_header(csvFile)
+    missing = [column for column in columns if column not in header]
+    if missing:
+        raise MissingColumnsError("csv does not have the columns {}, found {}".format(missing, header))
     with warnings.catch_warnings():
         warnings.simplefilter(action='ignore', category=FutureWarning)
-        prices = pandas.read_csv(stockHistoricalPricesCSV).to_dict('r')
-        pricesReturn = []
-        logger.debug(prices)
-        for price in prices:
-            price['Dollar Value Traded'] = price.pop('$ Value Traded')
-            pricesReturn.append(price)
-        return pricesReturn
+        if csvEngine == 'pyarrow':
+            # The pyarrow engine has no thousands option, so numbers are read as text and converted afterwards
+            csvDF = pandas.read_csv(csvFile, usecols=list(columns), dtype={column: str for column in columns}, engine=csvEngine)
+            for column, dtype in columns.items():
+                if dtype is not str:
+                    csvDF[column] = pandas.to_numeric(csvDF[column].str.replace(',', '', regex=False)).astype(dtype)
+        else:
+            csvDF = pandas.read_csv(csvFile, usecols=list(columns), dtype=columns, thousands=',', engine=csvEngine)
+    dates = pandas.to_datetime(csvDF[dateColumn], format=csvDateFormat, errors='coerce')
+    badDates = dates.isna()
+    if badDates.any():
+        logger.warning("Dropped {} rows with unreadable {} values: {}".format(int(badDates.sum()), dateColumn, csvDF.loc[badDates, dateColumn].head(5).tolist()))
+    csvDF[dateColumn] = dates
+    return csvDF[~badDates]
+
+def read_download(downloadFile):
+    """
+    Reads a file Chrome downloaded into the temporary folder
+
+    Args:
+        downloadFile (String): Location where file is located
+
+    Returns:
+        (Bytes): the file content
+
+    Raises:
+        FileNotFoundError: if Chrome did not download the file, so the company fails and is retried
+    """
+    with open(downloadFile, 'rb') as download:
+        return download.read()
+
+def get_stock_historical_prices(stockHistoricalPricesCSV) :
+    """
+    Reads in the csv and outputs a PriceSeries for storage in the stock dictionary
+
+    Args:
+        stockHistoricalPricesCSV (String or BytesIO): Location where file is located, or its content
+
+    Returns:
+        (PriceSeries): array backed historical prices
+    """
+    prices = PriceSeries.from_dataframe(read_typed_csv(stockHistoricalPricesCSV, priceColumns, 'Date'))
+    logger.debug("%s", prices)
+    return prices
 
 def get_director_information(directorSoup):
     """
@@ -161,27 +305,27 @@ def get_director_information(directorSoup):
 
 def get_stock_historical_dividends(stockHistoricalDividendsCSV) :
     """
-    Reads in the csv and outputs a dictionary for storage in the Stock class
+    Reads in the csv and outputs a DividendSeries for storage in the stock dictionary
 
     Args:
-        stockHistoricalDividendsCSV (String): Location where file is located
+        stockHistoricalDividendsCSV (String or BytesIO): Location where file is located, or its content
 
     Returns:
-        (Dict): dictionary of historical dividends
+        (DividendSeries): historical dividends, None if the company has no dividend information
     """
-    with warnings.catch_warnings():
-        warnings.simplefilter(action='ignore', category=FutureWarning)
-        logger.debug(pandas.read_csv(stockHistoricalDividendsCSV))
-        dividendDF = pandas.read_csv(stockHistoricalDividendsCSV)
-        dividendDF = dividendDF.dropna()
-        try:
-            dividendDF = dividendDF[['Ex Date', 'Gross Amount']]
-            dividendDF.columns = ['Date', 'Dividend Paid']
-            dividendDF = dividendDF[dividendDF['Dividend Paid'] != '-']
-            return dividendDF.to_dict('r')
-        except:
-            logger.warning("No dividend information")
-            return None
+    try:
+        dividendDF = read_typed_csv(stockHistoricalDividendsCSV, dividendColumns, 'Ex Date')
+    except (pandas.errors.EmptyDataError, MissingColumnsError):
+        # Companies without dividends get an empty csv, or one without the dividend columns
+        logger.warning("No dividend information")
+        return None
+    dividendDF.columns = ['Date', 'Dividend Paid']
+    # Amounts which are not numbers ('-') are dropped
+    dividendDF['Dividend Paid'] = pandas.to_numeric(dividendDF['Dividend Paid'], errors='coerce')
+    dividendDF = dividendDF.dropna()
+    dividends = DividendSeries.from_dataframe(dividendDF)
+    logger.debug("%s", dividends)
+    return dividends
 
 def get_financial_profile(stockSoup) :
     """
@@ -261,49 +405,141 @@ def get_company_profile(profileSoup):
     companyProfileDict[profList[4].text] = profList[4].find_next_sibling('tr').td.text
     return companyProfileDict
 
-def list_companies(browser):
+def login(browser):
     """
-    Creates a list which will be used to iterate through selected companies
+    Logs into the NZX system from the landing page opened by get_browser()
 
     Args:
         browser (Selenium.WebDriver): The automated Chrome browser
-
-    Returns:
-        stockNames (List): list of company tickers to be scraped
     """
-    # Login
     browser.find_element_by_xpath('//*[@id="username"]').send_keys(username)
     browser.find_element_by_xpath('//*[@id="password"]').send_keys(password)
     browser.find_element_by_xpath('//*[@id="login"]/section[4]/button').click()
     logger.info("Logged into NZX System")
 
+def open_market_overview(browser):
+    """
+    Navigates from the page after login to the Market Overview, sorted by market cap in descending order.
+    scrape_company() starts from this page.
+
+    Args:
+        browser (Selenium.WebDriver): The automated Chrome browser
+    """
     # Arrive at Market Activity Page
-    browser.find_element_by_xpath(".//a[contains(text(), 'Company Research')]").click()
+    click_when_ready(browser, By.XPATH, ".//a[contains(text(), 'Company Research')]")
     logger.info("Arrived at Market Activity Page")
     # Click "View all" for main market
-    browser.find_elements_by_xpath(".//a[contains(text(), 'view all')]")[0].click()
+    wait_for_elements(browser, By.XPATH, ".//a[contains(text(), 'view all')]")[0].click()
     logger.info("Arrived at Market Overview Page")
+    sort_by_market_cap(browser)
+
+def sort_by_market_cap(browser):
+    """
+    Sorts the Market Overview of a market by market cap in descending order
+
+    Args:
+        browser (Selenium.WebDriver): The automated Chrome browser
+    """
     # Sort in descending order by clicking the 26th "a" tag
-    browser.find_elements_by_css_selector('td > a')[25].click()
+    wait_for_elements(browser, By.CSS_SELECTOR, 'td > a', 26)[25].click()
     logger.info("Arrived at Market Overview sorted by marketcap in descending order")
 
-    # Parse the page source into BeautifulSoup
-    # The page is the list of stocks in Descending order of Market Cap
-    html = browser.page_source
-    htmlSoup =   BeautifulSoup(html,'lxml')
-    logger.info("Market Overview Page parsed")
+def parse_market_cap(text):
+    """
+    Converts a market cap cell such as '$1,234,567' into a number
+
+    Returns:
+        (Float): the market cap, None if the cell is not a number
+    """
+    try:
+        return float(text.replace('$', '').replace(',', '').strip())
+    except ValueError:
+        return None
+
+def parse_listing_page(html, pageUrl):
+    """
+    Finds the companies listed on one page of a Market Overview, parsing only the rows of the page
+
+    Args:
+        html (String): page source of the Market Overview page
+        pageUrl (String): url of the page, to resolve the links to the companies against
+
+    Yields:
+        (Tuple): (ticker, market cap, link to the company summary page) for every company on the page, in page order
+    """
+    marketCapColumn = None
+    for row in BeautifulSoup(html, 'lxml', parse_only=listingStrainer).find_all('tr'):
+        cells = row.find_all('td')
+        stockLink = row.find('a', {'class': 'text'})
+        if stockLink is None:
+            # The heading row gives the position of the market cap column
+            for column, cell in enumerate(cells):
+                if marketCapHeading.search(cell.text):
+                    marketCapColumn = column
+            continue
+        marketCap = parse_market_cap(cells[marketCapColumn].text) if marketCapColumn is not None and marketCapColumn < len(cells) else None
+        yield stockLink.getText(), marketCap, urljoin(pageUrl, stockLink.get('href', ''))
+
+def iterate_companies(browser, limit=COMPANIES):
+    """
+    Walks the Market Overview of every market (main board first) page by page, sorted by market cap,
+    yielding each company as soon as its page is read. Companies listed on more than one market are yielded once.
+    The order is only sorted within each market, see MarketCapRanking for ranking the companies across markets.
 
-    # Put all the stock tickers into a list
-    stocksSoup = htmlSoup.find_all('a', {'class' : 'text'}, limit=COMPANIES)
-    stockNames = []
-    for stock in stocksSoup :
-        stockNames.append(stock.getText())
+    Args:
+        browser (Selenium.WebDriver): The automated Chrome browser, logged in. It is left on the last page read
+        limit (Int): [Optional] stop after this many companies, every company is listed if None
 
-    logger.info("List of companies to scrape finalised")
-    print("List of companies to scrape finalised")
-    return stockNames
+    Yields:
+        (Tuple): (ticker, market cap, link to the company summary page)
+    """
+    seen = set()
+    click_when_ready(browser, By.XPATH, ".//a[contains(text(), 'Company Research')]")
+    marketCount = len(wait_for_elements(browser, By.XPATH, ".//a[contains(text(), 'view all')]"))
+    for market in range(marketCount):
+        if market:
+            click_when_ready(browser, By.XPATH, ".//a[contains(text(), 'Company Research')]")
+        wait_for_elements(browser, By.XPATH, ".//a[contains(text(), 'view all')]", market + 1)[market].click()
+        sort_by_market_cap(browser)
+        page = 1
+        while True:
+            for stock, marketCap, stockLink in parse_listing_page(browser.page_source, browser.current_url):
+                if stock in seen:
+                    continue
+                seen.add(stock)
+                yield stock, marketCap, stockLink
+                if limit and len(seen) >= limit:
+                    return
+            logger.info("Market {} page {} listed, {} companies so far".format(market + 1, page, len(seen)))
+            nextPage = browser.find_elements_by_xpath(nextPageLink)
+            firstStock = browser.find_elements_by_css_selector('a.text')
+            if not nextPage or not firstStock:
+                break
+            nextPage[0].click()
+            WebDriverWait(browser, ELEMENT_WAIT).until(EC.staleness_of(firstStock[0]))
+            page += 1
+
+class ScrapeCancelled(Exception):
+    """
+    Raised within a scrape_company() call which its caller has given up on
+    """
+    pass
 
-def scrape_company(browser, stock):
+def check_cancelled(cancelled, stock):
+    """
+    Stops an abandoned scrape before its next side effect, so it can not race the scrape which replaced it
+
+    Args:
+        cancelled (threading.Event): set by the caller once it has given up, None if the scrape can not be cancelled
+        stock (String): The stock ticker being scraped
+
+    Raises:
+        ScrapeCancelled: if the event is set
+    """
+    if cancelled is not None and cancelled.is_set():
+        raise ScrapeCancelled(stock)
+
+def scrape_company(browser, stock, extractor=None, sections=None, stockLink=None, cancelled=None):
     """
     Contains the logic behind the scraping of an entire company's data
 
@@ -312,102 +548,145 @@ def scrape_company(browser, stock):
     Args:
         browser (Selenium.WebDriver): The automated Chrome browser
         stock (String): The stock ticker currently being scraped
+        extractor (PdfExtractor): [Optional] queues the downloaded pdfs for extraction
+        sections (Set): [Optional] names of the sections to fetch, see RefreshScheduler. Everything is fetched if not given.
+                        Summary and Ratio are always included, as they come from the page every other section is reached from
+        stockLink (String): [Optional] url of the company summary page, needed for companies which are not on the current Market Overview page
+        cancelled (threading.Event): [Optional] set when the caller gives up on the company. Checked before every shared side effect:
+                                     updating the annual report or parse cache, capturing a file and queueing a pdf for extraction
 
     Returns:
-        stockData (Stock): Class containing dictionaries of data
+        stockData (Dict): dictionary of the fetched sections
+
+    Raises:
+        ScrapeCancelled: if cancelled is set
     """
+    if sections is None:
+        sections = set(allSections)
     logger.info("Current Stock: " + stock)
     stockInnerIteration = 0
     numFuncs = 10
     printProgressBar(stockInnerIteration, numFuncs, prefix='Scraping {} data'.format(stock), suffix = 'of {} completed'.format(stock))
 
     # Arrive at Summary & Ratios page and pull information
-    browser.find_element_by_link_text(stock).click()
+    if stockLink:
+        browser.get(stockLink)
+    else:
+        click_when_ready(browser, By.LINK_TEXT, stock)
     summarySoup = BeautifulSoup(browser.page_source, 'lxml')
     logger.info("Pulling ratio information")
-    stockSummaryDict = get_stock_summary(summarySoup)
+    stockData = {'Summary': get_stock_summary(summarySoup)}
     stockInnerIteration +=1
     printProgressBar(stockInnerIteration, numFuncs, prefix='Scraping {} data'.format(stock), suffix = 'of {} completed'.format(stock))
-    stockRatioDict = get_ratios(summarySoup)
+    stockData['Ratio'] = get_ratios(summarySoup)
     stockInnerIteration +=1
     printProgressBar(stockInnerIteration, numFuncs, prefix='Scraping {} data'.format(stock), suffix = 'of {} completed'.format(stock))
 
+    # Files are either captured in memory, or downloaded by Chrome into the temporary folder
+    capture = DownloadCapture(browser) if DOWNLOAD_CAPTURE else None
+
     # Create csv link for historical prices and pull it into a temporary folder
-    csvLink = create_historical_prices_csv_link(stock)
-    logger.info("Pulling historical prices information")
-    browser.get(csvLink)
+    if 'HistoricalPrices' in sections:
+        csvLink = create_historical_prices_csv_link(stock)
+        logger.info("Pulling historical prices information")
+        pricesCSV = capture.fetch(csvLink) if capture else None
+        # Without capture, or if the capture failed, Chrome downloads the csv into the temporary folder
+        if pricesCSV is None:
+            browser.get(csvLink)
 
     # Create csv link for dividends and pull it into a temporary folder
-    csvLink = create_historical_dividends_csv_link(stock)
-    logger.info("Pulling historical dividends information")
-    browser.get(csvLink)
-
-    # Arrive at Annual Reports and pull latest annual report
-    # TODO May require refactor of xpath to shorten it (Looks nicer)
-    # TODO change dl directory outside temp
-    # Create try catch block
-    try :
+    if 'HistoricalDividends' in sections:
+        csvLink = create_historical_dividends_csv_link(stock)
+        logger.info("Pulling historical dividends information")
+        dividendsCSV = capture.fetch(csvLink) if capture else None
+        if dividendsCSV is None:
+            browser.get(csvLink)
+
+    # Find the latest annual report with HEAD requests, and only download that one
+    if 'AnnualReport' in sections:
         logger.info("Pulling annual report")
-        year = int(datetime.now().strftime('%Y'))
-        annualReportLink = create_annual_report_link(stock, str(year))
-        browser.get(annualReportLink)
-        if browser.find_element_by_xpath(".//title[contains(text(), '404 Not Found')]"):
-            browser.execute_script("window.history.go(-1)") # Go back to summary page
-            annualReportLink = create_annual_report_link(stock, str(year-1))
-            browser.get(annualReportLink)
-            if browser.find_element_by_xpath(".//title[contains(text(), '404 Not Found')]"):
-                browser.execute_script("window.history.go(-1)") # Go back to summary page
-    except:
-        pass
+        check_cancelled(cancelled, stock)
+        annualReportLink = annualReportResolver.resolve(browser, stock)
+        if annualReportLink:
+            annualReportFile = annualReportLink.split('/')[-1]
+            check_cancelled(cancelled, stock)
+            if capture:
+                annualReport = capture.capture_file(annualReportLink, annualReportFile)
+            else:
+                browser.get(annualReportLink)
+                annualReport = os.path.join(downloadDirectory, annualReportFile)
+            check_cancelled(cancelled, stock)
+            if extractor and annualReport:
+                extractor.submit(stock, 'AnnualReport', annualReport)
     stockInnerIteration +=1
     printProgressBar(stockInnerIteration, numFuncs, prefix='Scraping {} data'.format(stock), suffix = 'of {} completed'.format(stock))
     # browser.execute_script("window.history.go(-1)") # Go back to summary page
 
     # Create and get the tear sheet for the company
-    tearSheetLink = 'https://companyresearch-nzx-com.ezproxy.aut.ac.nz/tearsheets/' + stock + '.pdf'
-    browser.get(tearSheetLink)
+    if 'Tearsheet' in sections:
+        tearSheetLink = 'https://companyresearch-nzx-com.ezproxy.aut.ac.nz/tearsheets/' + stock + '.pdf'
+        check_cancelled(cancelled, stock)
+        if capture:
+            tearSheet = capture.capture_file(tearSheetLink, stock + '.pdf')
+        else:
+            browser.get(tearSheetLink)
+            tearSheet = os.path.join(downloadDirectory, stock + '.pdf')
+        check_cancelled(cancelled, stock)
+        if extractor and tearSheet:
+            extractor.submit(stock, 'Tearsheet', tearSheet)
     stockInnerIteration +=1
     printProgressBar(stockInnerIteration, numFuncs, prefix='Scraping {} data'.format(stock), suffix = 'of {} completed'.format(stock))
 
     # Arrive at Company Directory and pull directors information
-    browser.find_element_by_xpath(".//span[contains(text(), 'Company Directory')]").click()
-    directorSoup = BeautifulSoup(browser.page_source, 'lxml')
-    logger.info("Pulling Director's information")
-    stockDirectorDict = get_director_information(directorSoup)
+    if 'Directors' in sections:
+        click_when_ready(browser, By.XPATH, ".//span[contains(text(), 'Company Directory')]")
+        logger.info("Pulling Director's information")
+        check_cancelled(cancelled, stock)
+        stockData['Directors'] = parseCache.parse(stock, 'Directors', browser.page_source,
+                                                  lambda page: get_director_information(BeautifulSoup(page, 'lxml')),
+                                                  parser_version(get_director_information))
+        browser.execute_script("window.history.go(-1)") # Go back to summary page
     stockInnerIteration +=1
     printProgressBar(stockInnerIteration, numFuncs, prefix='Scraping {} data'.format(stock), suffix = 'of {} completed'.format(stock))
-    browser.execute_script("window.history.go(-1)") # Go back to summary page
 
     # Arrive at Company Profile and pull description information
-    browser.find_element_by_xpath(".//span[contains(text(), 'Company Profile')]").click()
-    profileSoup = BeautifulSoup(browser.page_source, 'lxml')
-    logger.info("Pulling company description")
-    stockProfileDict = get_company_profile(profileSoup)
-    logger.debug(stockProfileDict)
+    if 'Profile' in sections:
+        click_when_ready(browser, By.XPATH, ".//span[contains(text(), 'Company Profile')]")
+        logger.info("Pulling company description")
+        check_cancelled(cancelled, stock)
+        stockData['Profile'] = parseCache.parse(stock, 'Profile', browser.page_source,
+                                                lambda page: get_company_profile(BeautifulSoup(page, 'lxml')),
+                                                parser_version(get_company_profile))
+        logger.debug("%s", stockData['Profile'])
+        browser.execute_script("window.history.go(-1)") # Go back to summary page
     stockInnerIteration +=1
     printProgressBar(stockInnerIteration, numFuncs, prefix='Scraping {} data'.format(stock), suffix = 'of {} completed'.format(stock))
-    browser.execute_script("window.history.go(-1)") # Go back to summary page
 
     # Arrive at Financial Profile and pull debt-equity information
-    browser.find_element_by_xpath(".//span[contains(text(), 'Financial Profile')]").click()
-    stockSoup = BeautifulSoup(browser.page_source, 'lxml')
-    logger.info("Pulling financial profile information")
-    stockFinancialProfileDict = get_financial_profile(stockSoup)
+    if 'FinancialProfile' in sections:
+        click_when_ready(browser, By.XPATH, ".//span[contains(text(), 'Financial Profile')]")
+        logger.info("Pulling financial profile information")
+        check_cancelled(cancelled, stock)
+        stockData['FinancialProfile'] = parseCache.parse(stock, 'FinancialProfile', browser.page_source,
+                                                         lambda page: get_financial_profile(BeautifulSoup(page, 'lxml')),
+                                                         parser_version(get_financial_profile))
+        browser.execute_script("window.history.go(-1)") # Go back to summary page
     stockInnerIteration +=1
     printProgressBar(stockInnerIteration, numFuncs, prefix='Scraping {} data'.format(stock), suffix = 'of {} completed'.format(stock))
-    browser.execute_script("window.history.go(-1)") # Go back to summary page
 
     # Read in the pries csv
-    stockHistoricalPricesDict = get_stock_historical_prices(
-                                tempDirectory + stock
-                                + " Historical Prices.csv")
+    if 'HistoricalPrices' in sections:
+        if pricesCSV is None:
+            pricesCSV = read_download(tempDirectory + stock + " Historical Prices.csv")
+        stockData['HistoricalPrices'] = get_stock_historical_prices(BytesIO(pricesCSV))
     stockInnerIteration +=1
     printProgressBar(stockInnerIteration, numFuncs, prefix='Scraping {} data'.format(stock), suffix = 'of {} completed'.format(stock))
 
     # Read in dividends csv
-    stockHistoricalDividendsDict = get_stock_historical_dividends(
-                                   tempDirectory + stock
-                                   + " Historical Dividends.csv")
+    if 'HistoricalDividends' in sections:
+        if dividendsCSV is None:
+            dividendsCSV = read_download(tempDirectory + stock + " Historical Dividends.csv")
+        stockData['HistoricalDividends'] = get_stock_historical_dividends(BytesIO(dividendsCSV))
     stockInnerIteration +=1
     printProgressBar(stockInnerIteration, numFuncs, prefix='Scraping {} data'.format(stock), suffix = 'of {} completed'.format(stock))
 
@@ -417,15 +696,6 @@ def scrape_company(browser, stock):
     stockInnerIteration +=1
     printProgressBar(stockInnerIteration, numFuncs, prefix='Scraping {} data'.format(stock), suffix = 'of {} completed'.format(stock))
 
-    # Create the stock obj and store it in an array
-    stockData = {'Summary':stockSummaryDict,
-                 'Ratio':stockRatioDict,
-                 'HistoricalPrices':stockHistoricalPricesDict,
-                 'HistoricalDividends':stockHistoricalDividendsDict,
-                 'FinancialProfile':stockFinancialProfileDict,
-                 'Profile':stockProfileDict,
-                 'Directors':stockDirectorDict}
-
     return stockData
 
 def get_ratios(stockSoup):
@@ -485,22 +755,3 @@ def get_ratios(stockSoup):
         ratioDict["Sharpe Ratio"] = float(0)
 
     return ratioDict
-
-def create_annual_report_link(stock, year):
-    """
-    Creates a url to retrieve the annual report based on the current stock and year
-
-    Args:
-        year (String): the annual report release year
-        stock (String): The stock ticker currently being scraped
-
-    Returns:
-        annualReportLink (String): url at which the annual report file is stored
-    """
-
-# 'https://companyresearch-nzx-com.ezproxy.aut.ac.nz/reports/nz/'2019/ANZ2019.pdf
-    annualReportLink = 'https://companyresearch-nzx-com.ezproxy.aut.ac.nz/reports/nz/'
-    annualReportLink += year + "/"
-    annualReportLink += stock + year + ".pdf"
-
-    return annualReportLink
\ No newline at end of file
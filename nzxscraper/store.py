@@ -0,0 +1,187 @@
+"""
+Local SQLite store holding the history of every scrape, and the queries used to read it back.
+"""
+from nzxscraper.environment import databaseFile
+from nzxscraper import logger
+import sqlite3
+
+schema = '''
+CREATE TABLE IF NOT EXISTS prices (
+    ticker TEXT NOT NULL, date TEXT NOT NULL,
+    last REAL, volume REAL, value_traded REAL,
+    PRIMARY KEY (ticker, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dividends (
+    ticker TEXT NOT NULL, date TEXT NOT NULL,
+    amount REAL,
+    PRIMARY KEY (ticker, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ratios (
+    ticker TEXT NOT NULL, date TEXT NOT NULL, name TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (ticker, date, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ratios_by_name ON ratios (name, date, ticker);
+CREATE TABLE IF NOT EXISTS fundamentals (
+    ticker TEXT NOT NULL, date TEXT NOT NULL, statement TEXT NOT NULL, item TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (ticker, date, statement, item)
+) WITHOUT ROWID;
+'''
+
+# Numeric values of the Summary section which are stored alongside the ratios
+summaryRatios = ('Price', 'Market Cap', 'Price Change', 'Risk', 'Score', 'Net Dividend Yield Index',
+                 'Return on Equity Index', 'Sharpe Ratio Index', 'Debt Equity Index')
+
+def is_number(value):
+    """
+    Checks whether a scraped value can be stored, so a missing or unreadable value never replaces a stored one
+
+    Returns:
+        (Boolean): True for ints and floats other than NaN
+    """
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value == value
+
+def get_connection(databasePath=databaseFile):
+    """
+    Opens the store, creating the tables on first use
+
+    Args:
+        databasePath (String): [Optional] location of the SQLite database
+
+    Returns:
+        connection (sqlite3.Connection): connection with rows returned as sqlite3.Row
+    """
+    connection = sqlite3.connect(databasePath)
+    connection.row_factory = sqlite3.Row
+    connection.executescript(schema)
+    return connection
+
+def ingest_snapshot(scrapeInsert, currentTimeStamp, databasePath=databaseFile):
+    """
+    Writes a snapshot built by save_data() into the store in a single transaction.
+    Only the values present in the snapshot are written. Ratios are stored one row per name, so the ratios of sections
+    which were not refreshed this run, and values which could not be read, keep their stored values
+
+    Args:
+        scrapeInsert (Dict): full snapshot built by save_data()
+        currentTimeStamp (String): the key of the current scrape within scrapeInsert ('YYYY/MM/DD')
+        databasePath (String): [Optional] location of the SQLite database
+    """
+    scrapeDate = currentTimeStamp.replace('/', '-')
+    prices, dividends, ratios, fundamentals = [], [], [], []
+
+    for ticker, stockInsert in scrapeInsert[currentTimeStamp].items():
+        if ticker == 'Date':
+            continue
+        for date, price in stockInsert.get('HistoricalPrices', {}).items():
+            prices.append((ticker, date, price['Last'], price['Volume'], price['Dollar Value Traded']))
+        for date, amount in stockInsert.get('HistoricalDividends', {}).items():
+            dividends.append((ticker, date, amount))
+        for name, value in stockInsert.get('Ratio', {}).items():
+            if is_number(value):
+                ratios.append((ticker, scrapeDate, name, value))
+        for name in summaryRatios:
+            if is_number(stockInsert.get('Summary', {}).get(name)):
+                ratios.append((ticker, scrapeDate, name, stockInsert['Summary'][name]))
+        for statement, items in stockInsert.get('FinancialProfile', {}).get('Data', {}).items():
+            for item, value in items.items():
+                if is_number(value):
+                    fundamentals.append((ticker, scrapeDate, statement, item, value))
+
+    connection = get_connection(databasePath)
+    try:
+        with connection:
+            connection.executemany("INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?)", prices)
+            connection.executemany("INSERT OR REPLACE INTO dividends VALUES (?, ?, ?)", dividends)
+            connection.executemany("INSERT OR REPLACE INTO ratios VALUES (?, ?, ?, ?)", ratios)
+            connection.executemany("INSERT OR REPLACE INTO fundamentals VALUES (?, ?, ?, ?, ?)", fundamentals)
+    finally:
+        connection.close()
+    logger.info("Stored {} prices, {} dividends, {} ratios and {} fundamentals".format(len(prices), len(dividends), len(ratios), len(fundamentals)))
+
+def query_range(table, ticker, fromDate='0000-00-00', toDate='9999-99-99', name=None, databasePath=databaseFile):
+    """
+    Reads the history of one company from a table between two dates
+
+    Args:
+        table (String): one of 'prices', 'dividends', 'ratios', 'fundamentals'
+        ticker (String): company ticker
+        fromDate (String): [Optional] first date, inclusive, 'YYYY-MM-DD'
+        toDate (String): [Optional] last date, inclusive, 'YYYY-MM-DD'
+        name (String): [Optional] only return this ratio or fundamentals statement
+        databasePath (String): [Optional] location of the SQLite database
+
+    Returns:
+        (List): one dictionary per row, oldest first
+    """
+    filterColumn = {'ratios': 'name', 'fundamentals': 'statement'}.get(table)
+    if table not in ('prices', 'dividends', 'ratios', 'fundamentals'):
+        raise ValueError("Unknown table " + table)
+    query = "SELECT * FROM {} WHERE ticker = ? AND date BETWEEN ? AND ?".format(table)
+    parameters = [ticker, fromDate, toDate]
+    if name and filterColumn:
+        query += " AND {} = ?".format(filterColumn)
+        parameters.append(name)
+    connection = get_connection(databasePath)
+    try:
+        return [dict(row) for row in connection.execute(query + " ORDER BY date", parameters)]
+    finally:
+        connection.close()
+
+def query_top_tickers(connection, rankBy, date, top):
+    """
+    Finds the companies with the highest value of a ratio on the latest scrape on or before a date
+
+    Args:
+        connection (sqlite3.Connection): open store connection
+        rankBy (String): ratio to rank by, e.g. 'Market Cap'
+        date (String): 'YYYY-MM-DD'
+        top (Int): number of companies to return
+
+    Returns:
+        (List): tickers, highest first
+    """
+    rows = connection.execute('''
+        SELECT r.ticker FROM ratios r
+        JOIN (SELECT ticker, MAX(date) AS date FROM ratios WHERE name = ? AND date <= ? GROUP BY ticker) latest
+        ON r.ticker = latest.ticker AND r.date = latest.date
+        WHERE r.name = ?
+        ORDER BY r.value DESC LIMIT ?''', (rankBy, date, rankBy, top))
+    return [row['ticker'] for row in rows]
+
+def query_cross_section(name, date, top=None, rankBy='Market Cap', fromDate=None, databasePath=databaseFile):
+    """
+    Reads one ratio across companies. Without fromDate, the latest value on or before date is returned for each company,
+    with fromDate every value between the two dates is returned.
+
+    Args:
+        name (String): ratio to read, e.g. 'Return on Equity'
+        date (String): last date, inclusive, 'YYYY-MM-DD'
+        top (Int): [Optional] only include the top companies by rankBy as of date
+        rankBy (String): [Optional] ratio used to select the top companies
+        fromDate (String): [Optional] first date, inclusive, 'YYYY-MM-DD'
+        databasePath (String): [Optional] location of the SQLite database
+
+    Returns:
+        (Dict): {ticker: {date: value}}
+    """
+    connection = get_connection(databasePath)
+    try:
+        if fromDate is None:
+            rows = connection.execute('''
+                SELECT r.ticker, r.date, r.value FROM ratios r
+                JOIN (SELECT ticker, MAX(date) AS date FROM ratios WHERE name = ? AND date <= ? GROUP BY ticker) latest
+                ON r.ticker = latest.ticker AND r.date = latest.date
+                WHERE r.name = ?''', (name, date, name))
+        else:
+            rows = connection.execute("SELECT ticker, date, value FROM ratios WHERE name = ? AND date BETWEEN ? AND ? ORDER BY date",
+                                      (name, fromDate, date))
+        tickers = set(query_top_tickers(connection, rankBy, date, top)) if top else None
+        crossSection = {}
+        for row in rows:
+            if tickers is None or row['ticker'] in tickers:
+                crossSection.setdefault(row['ticker'], {})[row['date']] = row['value']
+        return crossSection
+    finally:
+        connection.close()
@@ -0,0 +1,167 @@
+"""
+Keeps one slow or broken company from stopping the whole run.
+Each company is given a deadline, after which it is abandoned, the browser is replaced, and the company is retried at the end of the run.
+"""
+from nzxscraper.environment import COMPANY_DEADLINE, MAX_RETRIES
+from nzxscraper.scrape_data import scrape_company, open_market_overview
+from nzxscraper import logger
+from threading import Thread, Event
+from time import sleep
+
+# Seconds waited after a failed attempt to replace the browser, multiplied by the attempt number
+browserRetrySeconds = 10
+
+class CompanyTimeout(Exception):
+    """
+    Raised when a company is not scraped before its deadline
+    """
+    pass
+
+class BrowserUnavailable(Exception):
+    """
+    Raised when the browser could not be replaced, as every company after it would fail too
+    """
+    pass
+
+class CompanyWatchdog:
+    """
+    Runs scrape_company() with a deadline on the current browser, and recovers the browser when a company fails.
+
+    Attributes:
+        browser (Selenium.WebDriver): the browser currently in use, replaced whenever a company hangs, None once quit
+        failed (List): companies waiting to be retried by retry_failed()
+    """
+    def __init__(self, browser, browserFactory, deadline=COMPANY_DEADLINE, maxRetries=MAX_RETRIES):
+        """
+        Args:
+            browser (Selenium.WebDriver): browser on the Market Overview page
+            browserFactory (Function): creates a new, logged in browser on the Market Overview page
+            deadline (Int): [Optional] seconds allowed for each company
+            maxRetries (Int): [Optional] number of times failed companies are retried at the end of the run
+        """
+        self.browser = browser
+        self.browserFactory = browserFactory
+        self.deadline = deadline
+        self.maxRetries = maxRetries
+        self.failed = []
+
+    def run_with_deadline(self, stock, extractor=None, sections=None, stockLink=None):
+        """
+        Scrapes a company, raising if it fails or runs out of time. Either way the browser is left on the Market Overview page.
+        A company which runs out of time is cancelled, so its abandoned thread stops before its next side effect
+        instead of racing the replacement browser.
+
+        Args:
+            stock (String): The stock ticker to scrape
+            extractor (PdfExtractor): [Optional] passed on to scrape_company()
+            sections (Set): [Optional] passed on to scrape_company()
+            stockLink (String): [Optional] passed on to scrape_company()
+
+        Returns:
+            stockData (Dict): dictionary of the fetched sections
+
+        Raises:
+            BrowserUnavailable: if the browser had to be replaced and could not be
+        """
+        outcome = {}
+        cancelled = Event()
+        browser = self.browser
+        def target():
+            try:
+                outcome['Data'] = scrape_company(browser, stock, extractor, sections, stockLink, cancelled)
+            except Exception as error:
+                outcome['Error'] = error
+
+        # A daemon thread, so an abandoned company can not keep the process alive
+        worker = Thread(target=target, name='scrape-' + stock, daemon=True)
+        worker.start()
+        worker.join(self.deadline)
+
+        if worker.is_alive():
+            logger.error("{} did not finish within {} seconds, replacing the browser".format(stock, self.deadline))
+            cancelled.set()
+            self.recycle_browser()
+            raise CompanyTimeout(stock)
+        if 'Error' in outcome:
+            logger.error("{} failed: {!r}".format(stock, outcome['Error']))
+            try:
+                open_market_overview(self.browser)
+            except Exception:
+                self.recycle_browser()
+            raise outcome['Error']
+        return outcome['Data']
+
+    def recycle_browser(self):
+        """
+        Quits the current browser, which also unblocks any call stuck on it, and replaces it with a new one
+
+        Raises:
+            BrowserUnavailable: if no new browser could be created within maxRetries + 1 attempts
+        """
+        self.quit()
+        for attempt in range(1, self.maxRetries + 2):
+            try:
+                self.browser = self.browserFactory()
+                logger.info("Browser replaced")
+                return
+            except Exception as error:
+                logger.error("Replacing the browser failed on attempt {}: {!r}".format(attempt, error))
+                if attempt <= self.maxRetries:
+                    sleep(browserRetrySeconds * attempt)
+        raise BrowserUnavailable("Could not replace the browser after {} attempts".format(self.maxRetries + 1))
+
+    def quit(self):
+        """
+        Quits the current browser, if there still is one
+        """
+        if self.browser is None:
+            return
+        try:
+            self.browser.quit()
+        except Exception as error:
+            logger.warning("Browser did not quit cleanly: {!r}".format(error))
+        self.browser = None
+
+    def scrape(self, stock, extractor=None, sections=None, context=None, stockLink=None):
+        """
+        Scrapes a company, queueing it for a retry instead of raising if it fails
+
+        Args:
+            stock (String): The stock ticker to scrape
+            extractor (PdfExtractor): [Optional] passed on to scrape_company()
+            sections (Set): [Optional] passed on to scrape_company()
+            context (Object): [Optional] returned with the data by retry_failed(), e.g. the rank of the company
+            stockLink (String): [Optional] passed on to scrape_company()
+
+        Returns:
+            stockData (Dict): dictionary of the fetched sections, None if the company failed
+
+        Raises:
+            BrowserUnavailable: if the browser could not be replaced, which ends the run
+        """
+        try:
+            return self.run_with_deadline(stock, extractor, sections, stockLink)
+        except BrowserUnavailable:
+            raise
+        except Exception:
+            self.failed.append((stock, extractor, sections, context, stockLink))
+            return None
+
+    def retry_failed(self):
+        """
+        Retries the failed companies, up to maxRetries rounds
+
+        Yields:
+            (Tuple): (stock, context, stockData) for every company which succeeded on a retry
+        """
+        for attempt in range(1, self.maxRetries + 1):
+            failed, self.failed = self.failed, []
+            if not failed:
+                break
+            logger.info("Retrying {} companies, attempt {}".format(len(failed), attempt))
+            for stock, extractor, sections, context, stockLink in failed:
+                stockData = self.scrape(stock, extractor, sections, context, stockLink)
+                if stockData is not None:
+                    yield stock, context, stockData
+        if self.failed:
+            logger.error("Gave up on: {}".format(", ".join(failure[0] for failure in self.failed)))
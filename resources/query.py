@@ -0,0 +1,44 @@
+from flask_restful import Resource, reqparse
+from datetime import date, timedelta
+from nzxscraper.store import query_range, query_cross_section
+
+def date_range_arguments():
+	parser = reqparse.RequestParser()
+	parser.add_argument('from', dest='fromDate', default=(date.today() - timedelta(days=365)).isoformat())
+	parser.add_argument('to', dest='toDate', default=date.today().isoformat())
+	return parser
+
+class PriceHistory(Resource):
+	def get(self, ticker):
+		args = date_range_arguments().parse_args()
+		return query_range('prices', ticker, args.fromDate, args.toDate), 200
+
+class DividendHistory(Resource):
+	def get(self, ticker):
+		args = date_range_arguments().parse_args()
+		return query_range('dividends', ticker, args.fromDate, args.toDate), 200
+
+class RatioHistory(Resource):
+	def get(self, ticker):
+		parser = date_range_arguments()
+		parser.add_argument('name')
+		args = parser.parse_args()
+		return query_range('ratios', ticker, args.fromDate, args.toDate, args.name), 200
+
+class FundamentalsHistory(Resource):
+	def get(self, ticker):
+		parser = date_range_arguments()
+		parser.add_argument('statement')
+		args = parser.parse_args()
+		return query_range('fundamentals', ticker, args.fromDate, args.toDate, args.statement), 200
+
+class CrossSection(Resource):
+	def get(self):
+		parser = reqparse.RequestParser()
+		parser.add_argument('name', required=True)
+		parser.add_argument('from', dest='fromDate')
+		parser.add_argument('to', dest='toDate', default=date.today().isoformat())
+		parser.add_argument('top', type=int)
+		parser.add_argument('rankBy', default='Market Cap')
+		args = parser.parse_args()
+		return query_cross_section(args.name, args.toDate, args.top, args.rankBy, args.fromDate), 200
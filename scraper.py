@@ -1,55 +1,236 @@
 from bs4 import BeautifulSoup
 import sys
 from time import time
-from nzxscraper.scrape_data import get_browser, list_companies, scrape_company
-from nzxscraper.save_data import save_data, save_log_to_pastebin
-from nzxscraper.environment import DEBUG, downloadDirectory, COMPANIES
+from nzxscraper.scrape_data import get_browser, iterate_companies, login, open_market_overview, parseCache
+from nzxscraper.save_data import save_data, save_log_to_pastebin, send_files_to_server
+from nzxscraper.environment import DEBUG, downloadDirectory, COMPANIES, LEASE_SECONDS, RUN_DEADLINE
 import shutil
-from nzxscraper import logger, printProgressBar
-from nzxscraper.analyse import analyse_company_risk, score_companies
+from nzxscraper import logger, printProgressBar, rotateLog
+from nzxscraper.analyse import analyse_company_risk
+from nzxscraper.scoring import ScoringEngine
+from nzxscraper.correlation import MarketStatistics
+from nzxscraper.extract import PdfExtractor
+from nzxscraper.scheduler import RefreshScheduler, MarketCapRanking
+from nzxscraper.distributed import SQLiteWorkQueue, WorkItem
+from nzxscraper.watchdog import CompanyWatchdog, BrowserUnavailable
+from nzxscraper.listing import ListingStream
+from datetime import datetime
+from time import sleep
+import platform
+import os
+
+def finish_scraping(stockDataArray, stockTickersList, scheduler, extractor, success):
+    """
+    Analyses and saves the scraped companies, then stores the state used by the next run
+
+    Args:
+        stockDataArray (List): dictionary of all scraped company information
+        stockTickersList (List): every listed ticker, in listing order
+        scheduler (RefreshScheduler): schedule the companies were scraped with
+        extractor (PdfExtractor): pdf extraction pool, shut down here, None if there is none
+        success (Boolean): To indicate whether the scraping was succesful
+    """
+    scoreUpdates = {}
+    if success:
+        analyse_company_risk(stockDataArray)
+        marketStatistics = MarketStatistics()
+        marketStatistics.retain(stockTickersList)
+        marketStatistics.update(stockDataArray)
+        scoringEngine = ScoringEngine()
+        scoringEngine.retain(stockTickersList)
+        rescored = scoringEngine.update(stockDataArray)
+        # A moved normalisation range rescores companies which were not scraped, their new scores are sent on their own
+        scrapedTickers = {stock['Summary']['Ticker'] for stock in stockDataArray}
+        scoreUpdates = {ticker: scoringEngine.summary_fields(ticker) for ticker in rescored if ticker not in scrapedTickers}
+    if extractor:
+        extractor.shutdown()
+    uploaded = save_data(stockDataArray, success, universe=stockTickersList, scoreUpdates=scoreUpdates)
+    # State derived from the scraped data is only kept once the server has it. If the upload failed,
+    # the sections are still due next run and their prices are added to the statistics then
+    if uploaded:
+        marketStatistics.save()
+        scoringEngine.save()
+        scheduler.retain(stockTickersList)
+        scheduler.save()
+    elif success:
+        logger.warning("Upload failed, the schedule, scores and market statistics were not saved")
+    logger.info("Temporary files deleted")
+    shutil.rmtree(downloadDirectory, ignore_errors=True)
+
+def open_browser():
+    """
+    Creates a browser which is logged in and on the Market Overview page, ready for scrape_company()
+
+    Returns:
+        browser (Selenium.WebDriver): The automated Chrome browser
+    """
+    browser = get_browser()
+    login(browser)
+    open_market_overview(browser)
+    return browser
 
 def start_scraping():
     # Log environment
     logger.info("Download directory: " + downloadDirectory)
     startTime = time()
-    browser = get_browser()
+    extractor = PdfExtractor()
+    scheduler = RefreshScheduler()
+    stockDataArray = []
     success = False
 
-    try:
-        stockTickersList = list_companies(browser)
+    # Companies are listed by a second browser while this one scrapes them
+    listings = ListingStream()
+    stockTickersList = listings.tickers
+    watchdog = CompanyWatchdog(open_browser(), open_browser)
 
-        # Initialise the array which is  going to store Stock class objects
-        stockDataArray = []
-
-        # For each ticker in the list, find the link to the respective summary page
+    try:
+        # Each company is scraped as soon as it is listed, from the link to its summary page
         stockIteration = 0
-        printProgressBar(stockIteration, len(stockTickersList), prefix='Scraping company data', suffix = 'of companies completed', length=50)
-        for stock in stockTickersList :
-            stockData = scrape_company(browser, stock)
-            stockDataArray.append(stockData)
+        ranking = MarketCapRanking()
+        for stock, marketCap, stockLink in listings:
+            rank = ranking.rank(marketCap)
+            # Only fetch the sections which are due, and skip the company if nothing is
+            dueSections = scheduler.due_sections(stock, rank)
+            if dueSections:
+                # A company which fails or hangs is retried after the others
+                stockData = watchdog.scrape(stock, extractor, dueSections, (rank, dueSections), stockLink)
+                if stockData is not None:
+                    scheduler.record(stock, rank, stockData, dueSections | {'Summary', 'Ratio'})
+                    stockDataArray.append(stockData)
+            else:
+                logger.info("Nothing due for " + stock)
             stockIteration += 1
-            printProgressBar(stockIteration, len(stockTickersList), prefix='Scraping company data', suffix = 'of companies completed', length=50)
+            # The number of listed companies is only known up front when it is limited
+            if COMPANIES:
+                printProgressBar(stockIteration, COMPANIES, prefix='Scraping company data', suffix = 'of companies completed', length=50)
+            else:
+                print("Scraped {} companies".format(stockIteration), end = '\r')
+        for stock, (rank, dueSections), stockData in watchdog.retry_failed():
+            scheduler.record(stock, rank, stockData, dueSections | {'Summary', 'Ratio'})
+            stockDataArray.append(stockData)
+        # Collect before the browser quits, as the last pdfs may still be downloading
+        extractor.collect(stockDataArray)
         success = True
         logger.info("Scraping complete")
         print("Scraping complete")
     finally:
-        browser.quit()
-        if success:
-            analyse_company_risk(stockDataArray)
-            score_companies(stockDataArray)
-        save_data(stockDataArray, success)
-        logger.info("Temporary files deleted")
-        shutil.rmtree(downloadDirectory)
+        watchdog.quit()
+        finish_scraping(stockDataArray, stockTickersList, scheduler, extractor, success)
+        if listings.complete:
+            parseCache.retain(stockTickersList)
+        parseCache.save()
+        parseCache.summary()
 
         endTime = time()
         logger.info("That took a total of: " + str(round(endTime-startTime)) + " seconds.")
-        logger.info(str(round((endTime-startTime)/COMPANIES)) + " seconds per company.")
+        logger.info(str(round((endTime-startTime)/max(len(stockTickersList), 1))) + " seconds per company.")
         logger.info("Scraping and saving complete")
         print("That took a total of: " + str(round(endTime-startTime)) + " seconds.")
-        print(str(round((endTime-startTime)/COMPANIES)) + " seconds per company.")
+        print(str(round((endTime-startTime)/max(len(stockTickersList), 1))) + " seconds per company.")
         print("Scraping and saving complete")
         # Pastebin logs are currently disabled as feature is not working as intended
         # save_log_to_pastebin()
 
+def start_coordinator(queue=None, pollSeconds=10, deadline=RUN_DEADLINE):
+    """
+    Publishes the companies which are due as work items, waits for workers to scrape them, then analyses and saves the results.
+    Any number of start_worker() processes, on this or other machines sharing the queue, do the scraping.
+
+    Args:
+        queue (WorkQueue): [Optional] the shared work queue, a SQLiteWorkQueue by default
+        pollSeconds (Int): [Optional] how often to check whether the run is finished
+        deadline (Int): [Optional] seconds to wait for the workers, after which unfinished companies are marked as failed
+    """
+    queue = queue or SQLiteWorkQueue()
+    startTime = time()
+    run = datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
+    scheduler = RefreshScheduler()
+    stockTickersList = []
+    items = []
+    browser = get_browser()
+    try:
+        login(browser)
+        # Each company is published as soon as it is listed, so workers can start before the listing ends
+        ranking = MarketCapRanking()
+        for stock, marketCap, stockLink in iterate_companies(browser):
+            rank = ranking.rank(marketCap)
+            stockTickersList.append(stock)
+            dueSections = scheduler.due_sections(stock, rank)
+            if dueSections:
+                item = WorkItem(run, stock, rank, dueSections, link=stockLink)
+                queue.publish(run, [item])
+                items.append(item)
+    finally:
+        browser.quit()
+
+    while queue.pending(run):
+        if time() - startTime > deadline:
+            queue.abandon(run, "Run did not finish within {} seconds".format(deadline))
+            break
+        sleep(pollSeconds)
+    logger.info("Run {} finished in {} seconds".format(run, round(time() - startTime)))
+
+    stockDataArray = []
+    for item, stockData in queue.results(run):
+        scheduler.record(item.ticker, item.rank, stockData, item.sections | {'Summary', 'Ratio'})
+        stockDataArray.append(stockData)
+    logger.info("{} of {} companies scraped".format(len(stockDataArray), len(items)))
+    # Pdfs were extracted by the workers
+    finish_scraping(stockDataArray, stockTickersList, scheduler, None, True)
+
+def start_worker(queue=None, workerId=None, idleSeconds=10):
+    """
+    Claims companies from the work queue and scrapes them until the queue is empty.
+    Downloaded pdfs are sent to the server by the worker, as they only exist on its machine.
+
+    Args:
+        queue (WorkQueue): [Optional] the shared work queue, a SQLiteWorkQueue by default
+        workerId (String): [Optional] unique name of the worker, the host name and process id by default
+        idleSeconds (Int): [Optional] how long to wait when items are leased to other workers but none are queued
+    """
+    queue = queue or SQLiteWorkQueue()
+    workerId = workerId or "{}-{}".format(platform.node(), os.getpid())
+    extractor = PdfExtractor()
+    watchdog = CompanyWatchdog(open_browser(), open_browser)
+    try:
+        while True:
+            item = queue.claim(workerId, LEASE_SECONDS)
+            if item is None:
+                # Leased items may still come back if their worker dies
+                if not queue.pending():
+                    break
+                sleep(idleSeconds)
+                continue
+            logger.info("{} claimed {}".format(workerId, item))
+            try:
+                stockData = watchdog.run_with_deadline(item.ticker, extractor, item.sections, item.link)
+                extractor.collect([stockData])
+                queue.complete(item, workerId, stockData)
+            except BrowserUnavailable as error:
+                # Every later company would fail too, so the worker stops and the company goes back to the queue
+                queue.fail(item, workerId, repr(error))
+                raise
+            except Exception as error:
+                # The queue retries the company, possibly on another worker
+                queue.fail(item, workerId, repr(error))
+    finally:
+        watchdog.quit()
+        extractor.shutdown()
+        parseCache.save()
+        parseCache.summary()
+        send_files_to_server()
+        shutil.rmtree(downloadDirectory, ignore_errors=True)
+    logger.info("{} found no more work".format(workerId))
+
 if __name__ == "__main__":
-    start_scraping()
+    # python scraper.py [coordinator|worker], a single process scrapes everything by default
+    mode = sys.argv[1] if len(sys.argv) > 1 else None
+    # Workers append to the log of the run they joined
+    if mode != 'worker':
+        rotateLog()
+    if mode == 'coordinator':
+        start_coordinator()
+    elif mode == 'worker':
+        start_worker()
+    else:
+        start_scraping()
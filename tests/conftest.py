@@ -0,0 +1,12 @@
+"""
+The package reads python_logging_configuration.json from the working directory and starts a new log file when it is imported,
+so the tests run from a temporary directory, leaving the log of a real run alone.
+"""
+import os
+import shutil
+import tempfile
+
+repositoryDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+testDirectory = tempfile.mkdtemp(prefix='nzxscraper-tests-')
+shutil.copy(os.path.join(repositoryDirectory, 'python_logging_configuration.json'), testDirectory)
+os.chdir(testDirectory)
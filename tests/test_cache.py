@@ -0,0 +1,49 @@
+from nzxscraper.cache import ParseCache, hash_content
+import json
+
+def count_calls(calls):
+    def parser(page):
+        calls.append(page)
+        return {'Length': len(page)}
+    return parser
+
+def test_unchanged_pages_are_not_parsed_again(tmp_path):
+    calls = []
+    cache = ParseCache(str(tmp_path / 'parse_cache.json'))
+    assert cache.parse('AIR', 'Profile', '<p>a</p>', count_calls(calls), 'v1') == {'Length': 8}
+    # Scripts carry session tokens, so they do not count as a change
+    assert cache.parse('AIR', 'Profile', '<p>a</p><script>token</script>', count_calls(calls), 'v1') == {'Length': 8}
+    assert len(calls) == 1
+    cache.parse('AIR', 'Profile', '<p>b</p>', count_calls(calls), 'v1')
+    assert len(calls) == 2
+
+def test_a_new_parser_version_parses_again(tmp_path):
+    calls = []
+    cache = ParseCache(str(tmp_path / 'parse_cache.json'))
+    cache.parse('AIR', 'Profile', '<p>a</p>', count_calls(calls), 'v1')
+    cache.parse('AIR', 'Profile', '<p>a</p>', count_calls(calls), 'v2')
+    assert len(calls) == 2
+
+def test_saves_from_several_processes_are_merged(tmp_path):
+    cacheFile = str(tmp_path / 'parse_cache.json')
+    first = ParseCache(cacheFile)
+    second = ParseCache(cacheFile)
+    first.parse('AIR', 'Profile', '<p>a</p>', count_calls([]), 'v1')
+    second.parse('FPH', 'Profile', '<p>b</p>', count_calls([]), 'v1')
+    first.save()
+    second.save()
+    with open(cacheFile, 'r') as saved:
+        entries = json.load(saved)
+    assert set(entries) == {'AIR', 'FPH'}
+    assert entries['AIR']['Profile'] == {'Hash': hash_content('<p>a</p>'), 'Parser': 'v1', 'Result': {'Length': 8}}
+
+def test_retain_removes_delisted_companies_from_the_file(tmp_path):
+    cacheFile = str(tmp_path / 'parse_cache.json')
+    cache = ParseCache(cacheFile)
+    cache.parse('AIR', 'Profile', '<p>a</p>', count_calls([]), 'v1')
+    cache.parse('XYZ', 'Profile', '<p>b</p>', count_calls([]), 'v1')
+    cache.save()
+    cache = ParseCache(cacheFile)
+    cache.retain(['AIR'])
+    cache.save()
+    assert set(ParseCache(cacheFile).entries) == {'AIR'}
@@ -0,0 +1,79 @@
+from nzxscraper.correlation import MarketStatistics
+from nzxscraper.prices import PriceSeries
+import numpy
+
+tickers = ['AIR', 'FPH', 'MEL', 'SPK', 'ZEL']
+
+def price_history(days, seed=1):
+    """
+    Random walks for every ticker over the same trading days, with a few days missing for some companies
+    """
+    generator = numpy.random.RandomState(seed)
+    dates = numpy.datetime64('2019-01-01') + numpy.arange(days)
+    history = {}
+    for column, ticker in enumerate(tickers):
+        prices = 10 * numpy.exp(numpy.cumsum(generator.normal(0, 0.02, len(dates))))
+        traded = generator.rand(len(dates)) > 0.05 * column
+        history[ticker] = (dates[traded], prices[traded])
+    return history
+
+def stocks(history, end, only=None):
+    stockDataArray = []
+    for ticker, (dates, prices) in history.items():
+        if only is not None and ticker not in only:
+            continue
+        kept = dates <= end
+        stockDataArray.append({'Summary': {'Ticker': ticker, 'Market Cap': 1e8 * (tickers.index(ticker) + 1)},
+                               'HistoricalPrices': PriceSeries(dates[kept], prices[kept], numpy.ones(kept.sum()), prices[kept])})
+    return stockDataArray
+
+def assert_same_sums(incremental, full):
+    assert incremental.tickers == full.tickers
+    for name in ('count', 'sums', 'squareSums', 'products'):
+        numpy.testing.assert_allclose(getattr(incremental, name), getattr(full, name), rtol=0, atol=1e-12)
+    numpy.testing.assert_array_equal(incremental.lastDates, full.lastDates)
+
+def test_staggered_refreshes_match_a_full_rebuild(tmp_path):
+    history = price_history(200)
+    start = numpy.datetime64('2019-01-01')
+    incremental = MarketStatistics(str(tmp_path / 'incremental.npz'))
+    incremental.update(stocks(history, start + 80))
+    # Companies are refreshed on their own schedules, so some fall behind the others
+    incremental.update(stocks(history, start + 140, only=['AIR', 'FPH']))
+    incremental.update(stocks(history, start + 170, only=['MEL', 'SPK', 'ZEL']))
+    incremental.update(stocks(history, start + 199))
+
+    full = MarketStatistics(str(tmp_path / 'full.npz'))
+    full.update(stocks(history, start + 199))
+    assert_same_sums(incremental, full)
+
+def test_daily_refreshes_match_a_full_rebuild(tmp_path):
+    history = price_history(60, seed=2)
+    start = numpy.datetime64('2019-01-01')
+    incremental = MarketStatistics(str(tmp_path / 'incremental.npz'))
+    for day in range(1, 60):
+        incremental.update(stocks(history, start + day))
+
+    full = MarketStatistics(str(tmp_path / 'full.npz'))
+    full.update(stocks(history, start + 59))
+    assert_same_sums(incremental, full)
+
+def test_new_companies_and_delistings(tmp_path):
+    history = price_history(50, seed=3)
+    start = numpy.datetime64('2019-01-01')
+    statistics = MarketStatistics(str(tmp_path / 'statistics.npz'))
+    statistics.update(stocks(history, start + 30, only=['AIR', 'FPH', 'MEL']))
+    statistics.update(stocks(history, start + 49, only=['SPK', 'ZEL']))
+    assert statistics.tickers == tickers
+    statistics.retain(['AIR', 'SPK'])
+    assert statistics.tickers == ['AIR', 'SPK']
+    assert statistics.count.shape == (3, 3)
+    assert statistics.windowReturns.shape[1] == 3
+
+def test_statistics_survive_a_reload(tmp_path):
+    history = price_history(40, seed=4)
+    cacheFile = str(tmp_path / 'statistics.npz')
+    statistics = MarketStatistics(cacheFile)
+    statistics.update(stocks(history, numpy.datetime64('2019-01-01') + 39))
+    statistics.save()
+    assert_same_sums(MarketStatistics(cacheFile), statistics)
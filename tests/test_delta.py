@@ -0,0 +1,70 @@
+from nzxscraper.delta import build_delta, hash_record
+
+def snapshot(date, tickers):
+    scrapeInsert = {date: {'Date': date}}
+    scrapeInsert[date].update(tickers)
+    return scrapeInsert
+
+def prices(*dates):
+    return {date: {'Last': float(day), 'Volume': 100.0, 'Dollar Value Traded': 100.0 * day} for day, date in enumerate(dates, 1)}
+
+def test_hash_record_ignores_key_order():
+    assert hash_record({'a': 1, 'b': 2}) == hash_record({'b': 2, 'a': 1})
+    assert hash_record({'a': 1}) != hash_record({'a': 2})
+
+def test_first_snapshot_is_sent_in_full():
+    scrapeInsert = snapshot('2020/01/03', {'AIR': {'Profile': {'Sector': 'Transport'}}})
+    deltaInsert, snapshotHashes = build_delta(scrapeInsert, '2020/01/03', None)
+    assert deltaInsert['2020/01/03']['AIR'] == {'Profile': {'Sector': 'Transport'}}
+    assert deltaInsert['Manifest']['Mode'] == 'full'
+    assert 'Manifest' not in deltaInsert['2020/01/03']
+    assert snapshotHashes['Date'] == '2020/01/03'
+
+def test_only_changed_and_removed_records_are_sent():
+    first = snapshot('2020/01/03', {'AIR': {'Directors': {'Smith': 'Chair', 'Jones': 'Director'}}})
+    _, previousHashes = build_delta(first, '2020/01/03', None)
+    second = snapshot('2020/01/04', {'AIR': {'Directors': {'Smith': 'Chair', 'Brown': 'Director'}}})
+    deltaInsert, _ = build_delta(second, '2020/01/04', previousHashes)
+    assert deltaInsert['2020/01/04']['AIR'] == {'Directors': {'Brown': 'Director'}}
+    manifest = deltaInsert['Manifest']
+    assert manifest['Mode'] == 'delta'
+    assert manifest['Base'] == '2020/01/03'
+    assert manifest['Tickers']['AIR']['Directors'] == {'Changed': 1, 'Removed': ['Jones'], 'Records': 2}
+
+def test_unchanged_snapshot_sends_no_companies():
+    first = snapshot('2020/01/03', {'AIR': {'Profile': {'Sector': 'Transport'}}})
+    _, previousHashes = build_delta(first, '2020/01/03', None)
+    deltaInsert, snapshotHashes = build_delta(snapshot('2020/01/04', {'AIR': {'Profile': {'Sector': 'Transport'}}}), '2020/01/04', previousHashes)
+    assert deltaInsert['2020/01/04'] == {'Date': '2020/01/04'}
+    assert deltaInsert['Manifest']['Tickers'] == {}
+    assert snapshotHashes['Tickers'] == previousHashes['Tickers']
+
+def test_dates_leaving_the_price_window_are_not_removed():
+    first = snapshot('2020/01/03', {'AIR': {'HistoricalPrices': prices('2020-01-01', '2020-01-02', '2020-01-03')}})
+    _, previousHashes = build_delta(first, '2020/01/03', None)
+    second = snapshot('2020/01/04', {'AIR': {'HistoricalPrices': prices('2020-01-02', '2020-01-04')}})
+    deltaInsert, _ = build_delta(second, '2020/01/04', previousHashes)
+    # 2020-01-01 fell out of the window, 2020-01-03 disappeared from within it
+    assert deltaInsert['Manifest']['Tickers']['AIR']['HistoricalPrices']['Removed'] == ['2020-01-03']
+
+def test_sections_and_companies_not_scraped_keep_their_hashes():
+    first = snapshot('2020/01/03', {'AIR': {'Profile': {'Sector': 'Transport'}, 'Directors': {'Smith': 'Chair'}},
+                                    'FPH': {'Profile': {'Sector': 'Health'}},
+                                    'XYZ': {'Profile': {'Sector': 'Gone'}}})
+    _, previousHashes = build_delta(first, '2020/01/03', None)
+    second = snapshot('2020/01/04', {'AIR': {'Profile': {'Sector': 'Transport'}}})
+    deltaInsert, snapshotHashes = build_delta(second, '2020/01/04', previousHashes, universe=['AIR', 'FPH'])
+    assert snapshotHashes['Tickers']['AIR']['Directors'] == previousHashes['Tickers']['AIR']['Directors']
+    assert snapshotHashes['Tickers']['FPH'] == previousHashes['Tickers']['FPH']
+    assert 'XYZ' not in snapshotHashes['Tickers']
+    assert deltaInsert['Manifest']['Dropped'] == ['XYZ']
+
+def test_partial_sections_keep_their_other_records():
+    first = snapshot('2020/01/03', {'AIR': {'Summary': {'Ticker': 'AIR', 'Price': 1.5, 'Score': 0.5}}})
+    _, previousHashes = build_delta(first, '2020/01/03', None)
+    second = snapshot('2020/01/04', {'AIR': {'Summary': {'Score': 0.6}}})
+    deltaInsert, snapshotHashes = build_delta(second, '2020/01/04', previousHashes, partial={'AIR': ('Summary',)})
+    assert deltaInsert['2020/01/04']['AIR'] == {'Summary': {'Score': 0.6}}
+    assert deltaInsert['Manifest']['Tickers']['AIR']['Summary']['Removed'] == []
+    assert snapshotHashes['Tickers']['AIR']['Summary']['Price'] == previousHashes['Tickers']['AIR']['Summary']['Price']
+    assert snapshotHashes['Tickers']['AIR']['Summary']['Score'] != previousHashes['Tickers']['AIR']['Summary']['Score']
@@ -0,0 +1,51 @@
+from nzxscraper.distributed import SQLiteWorkQueue, WorkItem
+from nzxscraper.prices import PriceSeries
+
+def queue_with(tmp_path, maxAttempts=3):
+    queue = SQLiteWorkQueue(str(tmp_path / 'queue.db'), maxAttempts)
+    queue.publish('run', [WorkItem('run', 'FPH', 2, ['Summary']), WorkItem('run', 'AIR', 1, ['Summary', 'HistoricalPrices'], link='air')])
+    return queue
+
+def test_items_are_claimed_in_rank_order(tmp_path):
+    queue = queue_with(tmp_path)
+    first = queue.claim('worker', 60)
+    second = queue.claim('worker', 60)
+    assert (first.ticker, first.rank, first.attempts, first.link) == ('AIR', 1, 1, 'air')
+    assert first.sections == {'Summary', 'HistoricalPrices'}
+    assert second.ticker == 'FPH'
+    assert queue.claim('worker', 60) is None
+    assert queue.pending('run') == 2
+
+def test_results_are_returned_as_scraped_data(tmp_path):
+    queue = queue_with(tmp_path)
+    item = queue.claim('worker', 60)
+    prices = PriceSeries(['2020-01-02'], [1.5], [1000], [1500])
+    assert queue.complete(item, 'worker', {'Summary': {'Ticker': 'AIR'}, 'HistoricalPrices': prices})
+    [(resultItem, result)] = queue.results('run')
+    assert resultItem.ticker == 'AIR'
+    assert result['HistoricalPrices'].to_dict() == prices.to_dict()
+
+def test_expired_leases_return_to_the_queue(tmp_path):
+    queue = queue_with(tmp_path)
+    item = queue.claim('worker', -1)
+    assert queue.pending('run') == 2
+    again = queue.claim('other', 60)
+    assert (again.ticker, again.attempts) == (item.ticker, 2)
+    # The first worker lost its lease, so its result is discarded
+    assert not queue.complete(item, 'worker', {'Summary': {'Ticker': item.ticker}})
+    assert queue.complete(again, 'other', {'Summary': {'Ticker': item.ticker}})
+
+def test_items_fail_after_their_last_attempt(tmp_path):
+    queue = queue_with(tmp_path, maxAttempts=1)
+    queue.claim('worker', -1)
+    assert queue.pending('run') == 1
+    item = queue.claim('worker', 60)
+    queue.fail(item, 'worker', 'Timed out')
+    assert queue.pending('run') == 0
+    assert queue.results('run') == []
+
+def test_abandon_fails_everything_left(tmp_path):
+    queue = queue_with(tmp_path)
+    queue.claim('worker', 60)
+    assert queue.abandon('run', 'Deadline passed') == 2
+    assert queue.pending('run') == 0
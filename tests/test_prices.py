@@ -0,0 +1,29 @@
+from nzxscraper.prices import PriceSeries, DividendSeries
+from nzxscraper.distributed import encode_result, decode_result
+import numpy
+
+def test_price_series_round_trip():
+    series = PriceSeries(['2020-01-03', '2020-01-02'], [1.5, 1.25], [1000, 2000], [1500.0, 2500.0])
+    restored = PriceSeries.from_dict(series.to_dict())
+    # from_dict sorts oldest first
+    assert restored.dates.tolist() == sorted(series.dates.tolist())
+    assert restored.to_dict() == series.to_dict()
+    assert series.to_dict()['2020-01-02'] == {'Last': 1.25, 'Volume': 2000.0, 'Dollar Value Traded': 2500.0}
+
+def test_dividend_series_round_trip():
+    series = DividendSeries(['2019-09-01', '2020-03-01'], [0.1, 0.125])
+    restored = DividendSeries.from_dict(series.to_dict())
+    assert numpy.array_equal(restored.dates, series.dates)
+    assert numpy.array_equal(restored.amounts, series.amounts)
+    assert len(restored) == 2
+
+def test_result_round_trip():
+    stockData = {
+                    'Summary': {'Ticker': 'AIR', 'Market Cap': 1e9},
+                    'HistoricalPrices': PriceSeries(['2020-01-02'], [1.5], [1000], [1500]),
+                    'HistoricalDividends': None,
+                }
+    restored = decode_result(encode_result(stockData))
+    assert restored['Summary'] == stockData['Summary']
+    assert restored['HistoricalPrices'].to_dict() == stockData['HistoricalPrices'].to_dict()
+    assert restored['HistoricalDividends'] is None
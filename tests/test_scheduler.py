@@ -0,0 +1,11 @@
+from nzxscraper.scheduler import MarketCapRanking
+
+def test_companies_are_ranked_by_market_cap_across_markets():
+    ranking = MarketCapRanking()
+    # Main board largest first, then a second market whose largest company is bigger than the last main board company
+    ranks = [ranking.rank(marketCap) for marketCap in (900.0, 500.0, 100.0, 300.0, 50.0)]
+    assert ranks == [0, 1, 2, 2, 4]
+
+def test_companies_without_a_market_cap_are_ranked_last():
+    ranking = MarketCapRanking()
+    assert [ranking.rank(marketCap) for marketCap in (900.0, None, 500.0)] == [0, 1, 1]
@@ -0,0 +1,69 @@
+from nzxscraper.scoring import ScoringEngine
+import pytest
+
+def company(ticker, netYield, sharpe, netIncome, equity, liabilities):
+    return {
+                'Summary': {'Ticker': ticker},
+                'Ratio': {'Net Yield': netYield, 'Sharpe Ratio': sharpe},
+                'FinancialProfile': {'Data': {'Income': {'Net Income': netIncome},
+                                              'Balance': {'Total Equity': equity, 'Total Liabilities': liabilities}}},
+           }
+
+def companies():
+    return [company('AIR', 4.0, 0.5, 10.0, 100.0, 50.0),
+            company('FPH', 1.5, 1.2, 30.0, 120.0, 20.0),
+            company('SPK', 6.0, -0.2, -5.0, 80.0, 90.0)]
+
+def test_scores_are_stored_in_the_summary(tmp_path):
+    engine = ScoringEngine(str(tmp_path / 'scoring.json'))
+    stockDataArray = companies()
+    rescored = engine.update(stockDataArray)
+    assert sorted(rescored) == ['AIR', 'FPH', 'SPK']
+    for stock in stockDataArray:
+        assert 0 <= stock['Summary']['Score'] <= 1
+        assert stock['Summary']['Score'] == engine.scores[stock['Summary']['Ticker']]
+        assert stock['Ratio']['Debt Equity'] == pytest.approx(engine.values['Debt Equity'][stock['Summary']['Ticker']])
+
+def test_incremental_update_matches_scoring_every_company(tmp_path):
+    engine = ScoringEngine(str(tmp_path / 'scoring.json'))
+    engine.update(companies())
+    engine.save()
+
+    # Only SPK is refreshed, and its new yield moves the top of the range
+    refreshed = company('SPK', 9.0, -0.2, -5.0, 80.0, 90.0)
+    engine = ScoringEngine(str(tmp_path / 'scoring.json'))
+    rescored = engine.update([refreshed])
+    assert set(rescored) == {'AIR', 'FPH', 'SPK'}
+
+    # AIR and FPH were not refreshed, so their new scores are read from the engine to be sent on their own
+    assert engine.summary_fields('AIR')['Score'] == engine.scores['AIR']
+
+    everyCompany = companies()[:2] + [company('SPK', 9.0, -0.2, -5.0, 80.0, 90.0)]
+    fresh = ScoringEngine(str(tmp_path / 'fresh.json'))
+    fresh.update(everyCompany)
+    assert engine.scores == pytest.approx(fresh.scores)
+    for ticker in fresh.indexes:
+        assert engine.indexes[ticker] == pytest.approx(fresh.indexes[ticker])
+
+def test_unchanged_refresh_rescores_nothing(tmp_path):
+    engine = ScoringEngine(str(tmp_path / 'scoring.json'))
+    engine.update(companies())
+    assert engine.update([companies()[0]]) == []
+
+def test_retain_forgets_delisted_companies(tmp_path):
+    engine = ScoringEngine(str(tmp_path / 'scoring.json'))
+    engine.update(companies())
+    engine.retain(['AIR', 'FPH'])
+    assert 'SPK' not in engine.scores
+    assert all('SPK' not in values for values in engine.values.values())
+    assert engine.sortedValues['Dividend Yield'] == [1.5, 4.0]
+
+def test_ranges_include_zero_with_a_buffer_of_one(tmp_path):
+    engine = ScoringEngine(str(tmp_path / 'scoring.json'))
+    engine.update(companies())
+    # Dividend yields are all positive, so the range runs from 0 to the highest yield + 1
+    assert engine.ranges['Dividend Yield'] == [7.0, 0]
+    # Sharpe ratios cross 0, so both ends get the buffer
+    assert engine.ranges['Sharpe Ratio'] == pytest.approx([2.2, -1.2])
+    assert engine.indexes['AIR']['Dividend Yield'] == pytest.approx(4.0 / 7.0)
+    assert engine.indexes['SPK']['Debt Equity'] == pytest.approx(1 - (90.0 / 80.0) / (90.0 / 80.0 + 1))
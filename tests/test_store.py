@@ -0,0 +1,19 @@
+from nzxscraper.store import ingest_snapshot, query_range
+
+def test_partial_snapshots_keep_stored_values(tmp_path):
+    databasePath = str(tmp_path / 'nzx.db')
+    full = {'2020/01/03': {'Date': '2020/01/03', 'AIR': {
+                'Summary': {'Ticker': 'AIR', 'Price': 1.5, 'Score': 0.5},
+                'Ratio': {'Net Yield': 4.0, 'Return on Equity': 10.0, 'Debt Equity': 0.5},
+                'HistoricalPrices': {'2020-01-03': {'Last': 1.5, 'Volume': 100.0, 'Dollar Value Traded': 150.0}},
+           }}}
+    ingest_snapshot(full, '2020/01/03', databasePath)
+    # Later the same day only the summary page was refreshed, without the financial profile behind two of the ratios
+    partial = {'2020/01/03': {'Date': '2020/01/03', 'AIR': {
+                'Summary': {'Ticker': 'AIR', 'Price': 1.6, 'Score': None},
+                'Ratio': {'Net Yield': 4.2, 'Return on Equity': float('nan')},
+              }}}
+    ingest_snapshot(partial, '2020/01/03', databasePath)
+    ratios = {row['name']: row['value'] for row in query_range('ratios', 'AIR', databasePath=databasePath)}
+    assert ratios == {'Price': 1.6, 'Score': 0.5, 'Net Yield': 4.2, 'Return on Equity': 10.0, 'Debt Equity': 0.5}
+    assert len(query_range('prices', 'AIR', databasePath=databasePath)) == 1